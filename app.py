@@ -1,158 +1,252 @@
-import io
 import os
+from concurrent.futures import as_completed
 
 import streamlit as st
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from PIL import Image
-
-from src.combine import combine_images_vertical
-from src.prompt import get_plot_writer_prompt
-from src.prompt_splitter import split_pages
 
+from src.cache import GenerationCache
+from src.engine import GENERATION_MODES, IMAGE_MODEL, ComicEngine, ProgressCallback
+from src.export import IMAGE_FORMATS, export_options, get_export_pool
+from src.image_buffer import ImageBuffer
+from src.metrics import get_tracer
+from src.preview import PreviewGenerator
+from src.retry import RetryPolicy
+from src.scheduler import get_scheduler
+from src.worker import EngineWorker
+from src.workspace import RunWorkspace, start_janitor
+
+# Streamlit runs this script on every interaction, and export worker processes
+# import it too: nothing expensive happens at module level. Shared resources
+# are created once per process by the cached getters below.
 load_dotenv()
-client = genai.Client()
+OUTPUT_DIR = os.getenv("COMIC_OUTPUT_DIR", "output")
+# Writing runs to disk is optional; pages are served from memory either way
+SAVE_OUTPUT = os.getenv("COMIC_SAVE_OUTPUT", "true").lower() in ("1", "true", "yes")
+# Start the engine, export workers and preview cache when the first session opens, rather than on first use
+PREWARM = os.getenv("COMIC_PREWARM", "false").lower() in ("1", "true", "yes")
 
 
-def generate_comic(num_pages, theme, additional_content, character_image, language, image_size):
-    """Main function to generate a manga comic"""
+@st.cache_resource(show_spinner=False)
+def get_cache():
+    return GenerationCache.from_env()
 
-    progress_bar = st.progress(0)
-    status_text = st.empty()
 
-    # Step 1: Generate plot
-    status_text.text("Step 1: Generating plot...")
-    progress_bar.progress(10)
+@st.cache_resource(show_spinner=False)
+def get_retry_policy():
+    # Shared by all sessions so the retry counters cover the whole process
+    return RetryPolicy()
 
-    plot_writer_prompt = get_plot_writer_prompt(theme, additional_content, num_pages, language)
 
-    plot_response = client.models.generate_content(
-        model="gemini-3-pro-preview", contents=plot_writer_prompt
-    )
+@st.cache_resource(show_spinner=False)
+def get_previews():
+    # Thumbnails and display versions shown instead of full-resolution images
+    return PreviewGenerator.from_env()
 
-    plot_text = plot_response.text
 
-    # Step 2: Split into page prompts
-    status_text.text("Step 2: Splitting into page-by-page prompts...")
-    progress_bar.progress(20)
+@st.cache_resource(show_spinner=False)
+def get_worker():
+    """
+    The EngineWorker all sessions' jobs run on, sharing one client and its connections.
 
-    pages_prompt = split_pages(plot_text)
+    The engine is built on the worker's thread, so the first page renders
+    without waiting for the google.genai import or the client.
+    """
+    cache = get_cache()
+    retry_policy = get_retry_policy()
 
-    # Display generated plot
-    with st.expander("📖 Generated Plot", expanded=False):
-        st.text(plot_text)
+    def create_engine():
+        # google-genai Client, or the offline fake with COMIC_BACKEND=fake
+        from src.backend import create_client
 
-    # Create chat session (image generation model)
-    chat = client.chats.create(
-        model="gemini-3-pro-image-preview",
-        config=types.GenerateContentConfig(
-            response_modalities=["IMAGE"],
-            image_config=types.ImageConfig(aspect_ratio="3:4", image_size=image_size),
-        ),
-    )
+        return ComicEngine(
+            create_client(),
+            cache=cache,
+            retry_policy=retry_policy,
+            # Stage timings and token usage of every run, exported to metrics/ (see README)
+            tracer=get_tracer(),
+            # Every session's model calls queue here, within the per-model rate and concurrency limits
+            scheduler=get_scheduler(),
+        )
 
-    # Generate each page
-    page_images = []
-    image_files = []
-    max_retries = 2
+    return EngineWorker(create_engine)
+
+
+@st.cache_resource(show_spinner=False)
+def prewarm():
+    """Start the engine worker and the export processes in the background, once per server."""
+    get_worker()
+    get_previews()
+    get_export_pool().warm()
+
+
+# Extra downloads offered next to the PNG comic, encoded in worker processes
+EXPORT_LABELS = {
+    "cbz": "CBZ comic archive",
+    "pdf": "PDF",
+    "pages": "Pages (ZIP)",
+    "strip": "Vertical strip",
+    "grid": "Grid",
+}
+
+RESUME_BUTTON = dict(
+    label="🔄 Resume Failed Run",
+    key="resume_button",
+    width="stretch",
+    help="Continue the last failed run from the first missing page, reusing its plot and finished pages",
+)
+
+
+class StreamlitProgress(ProgressCallback):
+    """
+    Shows pipeline progress in Streamlit: a progress bar and status line, the
+    plot, and a page gallery that fills in as each page arrives.
+    """
+
+    def __init__(self):
+        self.progress_bar = st.progress(0)
+        self.status_text = st.empty()
+        self.plot_slot = st.empty()
+        self.message = ""
+        self.queue_message = None
+        self.comic_slot = None
+        self.export_slot = None
+        self.page_slots = []
+        self.page_previews = {}
+
+    def start(self, num_pages):
+        # Lay out the result area up front so every page can be shown as soon as it exists
+        st.subheader("📖 Completed Manga")
+        self.comic_slot = st.empty()
+        self.comic_slot.info("🛠️ The full comic will appear here once every page is done.")
+        self.export_slot = st.empty()
 
-    for page_num in range(1, num_pages + 1):
-        status_text.text(
-            f"Step {page_num + 2}: Generating page {page_num}/{num_pages}..."
-        )
-        progress = 20 + (page_num / num_pages) * 60
-        progress_bar.progress(int(progress))
-
-        page_key = f"page{page_num}"
-        page_generated = False
-        retry_count = 0
-
-        while not page_generated and retry_count < max_retries:
-            try:
-                # For page 1, include the character reference image if provided
-                if page_num == 1:
-                    if character_image is not None:
-                        response = chat.send_message(
-                            [
-                                "Use this character design as a reference for the main character(s) in the manga.",
-                                character_image,
-                                pages_prompt[page_key],
-                            ]
+        st.markdown("---")
+
+        st.subheader("📄 Individual Pages")
+        cols = st.columns(min(num_pages, 4))
+        self.page_slots = []
+        for idx in range(num_pages):
+            with cols[idx % 4]:
+                slot = st.empty()
+                slot.caption(f"⏳ Page {idx + 1}")
+                self.page_slots.append(slot)
+
+    def status(self, message, percent):
+        self.message = message
+        self.status_text.text(message)
+        self.progress_bar.progress(percent)
+
+    def plot_ready(self, plot_text):
+        # Display generated plot
+        with self.plot_slot.container():
+            with st.expander("📖 Generated Plot", expanded=False):
+                st.text(plot_text)
+
+    def page_ready(self, page_num, page_image):
+        preview = get_previews().page(page_image)
+        self.page_previews[page_num] = preview
+        with self.page_slots[page_num - 1].container():
+            st.image(
+                preview.thumbnail.data,
+                caption=f"Page {page_num}",
+                width="stretch",
+            )
+
+            # Individual download button (full resolution)
+            st.download_button(
+                label="Download",
+                data=page_image.data,
+                file_name=f"page{page_num}_image{page_image.extension}",
+                mime=page_image.mime_type,
+                key=f"download_{page_num}",
+                on_click="ignore",
+                width="stretch",
+            )
+
+    def show_comic(self, comic, page_reports=()):
+        """Display the combined comic once it has been built, with the bytes saved by post-processing."""
+        # The full strip can be tens of thousands of pixels tall; show the page
+        # display versions stacked instead and leave full resolution to the download.
+        strip = get_previews().strip([self.page_previews[page_num] for page_num in sorted(self.page_previews)])
+        with self.comic_slot.container():
+            st.image(strip.data, caption="Preview — download for full resolution", width="stretch")
+
+            # Download button for full comic
+            st.download_button(
+                label="💾 Download Full Comic",
+                data=comic.data,
+                file_name=f"{len(self.page_slots)}_page_comic.png",
+                mime=comic.mime_type,
+                on_click="ignore",
+                width="stretch",
+            )
+            if page_reports:
+                original = sum(report.original_bytes for report in page_reports)
+                processed = sum(report.processed_bytes for report in page_reports)
+                per_page = ", ".join(
+                    f"page {report.page_num}: {-report.saved_bytes / 1e6:+.2f}" for report in page_reports
+                )
+                st.caption(f"🧹 Clean-up: pages {original / 1e6:.2f} MB → {processed / 1e6:.2f} MB ({per_page} MB)")
+
+    def show_exports(self, pages, kinds, image_format, title, language):
+        """Encode the extra downloads in the export pool and offer each one as soon as it is ready."""
+        pool = get_export_pool()
+        futures = {
+            pool.submit(pages, kind, image_format, **export_options(kind, title, language)): kind for kind in kinds
+        }
+        with self.export_slot.container():
+            cols = st.columns(len(futures))
+            with st.spinner("Preparing downloads..."):
+                for index, future in enumerate(as_completed(futures)):
+                    kind = futures[future]
+                    with cols[index]:
+                        try:
+                            export = future.result()
+                        except Exception as e:
+                            st.warning(f"{EXPORT_LABELS[kind]} export failed: {e}")
+                            continue
+                        st.download_button(
+                            label=f"📦 {EXPORT_LABELS[kind]} ({len(export.data) / 1e6:.1f} MB)",
+                            data=export.data,
+                            file_name=export.name,
+                            mime=export.mime_type,
+                            key=f"export_{kind}",
+                            on_click="ignore",
+                            width="stretch",
                         )
-                    else:
-                        response = chat.send_message(pages_prompt[page_key])
-                else:
-                    # For subsequent pages, send prompt + previous page image(s)
-                    message_parts = [pages_prompt[page_key]]
-
-                    if page_images:
-                        # Reference only the most recent page
-                        prev_image = Image.open(f"page{len(page_images)}_image.png")
-                        message_parts.append(prev_image)
-
-                    response = chat.send_message(message_parts)
-
-                # Check if response and response.parts are valid
-                if response is None:
-                    raise ValueError("Received None response from API")
-                
-                if not hasattr(response, 'parts') or response.parts is None:
-                    raise ValueError("Response has no valid parts attribute")
-
-                # Save generated image
-                image_found = False
-                for part in response.parts:
-                    if part.inline_data is not None:
-                        page_image = part.as_image()
-                        page_path = f"page{page_num}_image.png"
-                        page_image.save(page_path)
-                        page_images.append(page_image)
-                        image_files.append(page_path)
-                        image_found = True
-                        page_generated = True
-                        break
-                
-                if not image_found:
-                    raise ValueError("No image data found in response")
-
-            except (TypeError, ValueError, AttributeError) as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    status_text.text(
-                        f"⚠️ Error generating page {page_num}, retrying ({retry_count}/{max_retries})..."
-                    )
-                    st.warning(f"Retrying page {page_num} due to: {str(e)}")
-                else:
-                    error_msg = f"Failed to generate page {page_num} after {max_retries} attempts: {str(e)}"
-                    st.error(error_msg)
-                    raise RuntimeError(error_msg)
-            except Exception as e:
-                error_msg = f"Unexpected error generating page {page_num}: {str(e)}"
-                st.error(error_msg)
-                raise RuntimeError(error_msg)
-
-    # Verify we have all pages
-    if len(page_images) != num_pages:
-        raise RuntimeError(
-            f"Expected {num_pages} pages but only generated {len(page_images)}"
-        )
 
-    # Combine all pages vertically
-    status_text.text("Final step: Combining all pages...")
-    progress_bar.progress(90)
+    def retry(self, page_num, attempt, max_retries, error):
+        self.status_text.text(
+            f"⚠️ Error generating page {page_num}, retrying ({attempt}/{max_retries})..."
+        )
+        st.warning(f"Retrying page {page_num} due to: {str(error)}")
 
-    output_file = f"{num_pages}_page_comic.png"
-    combine_images_vertical(image_files, output_file)
+    def error(self, message):
+        st.error(message)
 
-    progress_bar.progress(100)
-    status_text.text("✅ Comic generation complete!")
+    def queued(self, status):
+        if status is None:
+            self.queue_message = None
+        else:
+            model = "image" if status.model == IMAGE_MODEL else "plot"
+            ahead = f"{status.position} job(s) ahead" if status.position else "next in line"
+            self.queue_message = f"⏳ Waiting for the {model} model: {ahead}, about {status.eta:.0f}s"
 
-    return output_file, image_files
+    def heartbeat(self):
+        # Any Streamlit call raises if the user navigated away or reran the
+        # script, which cancels the generation job and its pending requests.
+        self.status_text.text(self.queue_message or self.message)
 
 
 def main():
     st.set_page_config(page_title="Manga Generator", page_icon="📚", layout="wide")
+    start_janitor(
+        OUTPUT_DIR,
+        max_age=float(os.getenv("COMIC_OUTPUT_MAX_AGE_HOURS", "24")) * 3600,
+        max_bytes=int(os.getenv("COMIC_OUTPUT_MAX_MB", "2048")) * 1024 * 1024,
+    )
+    if PREWARM:
+        prewarm()
 
     st.title("📚 AI Manga Generator")
     st.markdown("---")
@@ -186,6 +280,21 @@ def main():
             help="Select the number of pages for the manga",
         )
 
+        # Page generation mode
+        generation_mode = st.selectbox(
+            "Generation Mode",
+            options=GENERATION_MODES,
+            format_func=lambda mode: {
+                "chained": "Sequential (most consistent)",
+                "windowed": "Sequential, recent pages only (faster for long comics)",
+                "parallel": "Parallel (faster)",
+            }[mode],
+            index=0,
+            help="Sequential draws each page from the previous one, resending the whole story so far. "
+            "Recent pages only sends the last two pages and a text summary of the rest. "
+            "Parallel draws page 1 first, then all other pages at once based on page 1.",
+        )
+
         # Theme
         theme = st.text_input(
             "Theme",
@@ -215,13 +324,58 @@ def main():
 
         character_image = None
         if character_image_file is not None:
-            character_image = Image.open(character_image_file)
+            # Keep the uploaded bytes as-is; they are sent to the API without re-encoding
+            character_image = ImageBuffer(character_image_file.getvalue(), character_image_file.type)
             st.image(
-                character_image,
+                character_image.data,
                 caption="Uploaded Image",
                 width="stretch",
             )
 
+        # Post-processing of the generated pages
+        st.subheader("Page Clean-up")
+        trim_pages = st.checkbox(
+            "Trim borders and align pages",
+            value=False,
+            help="Crop uniform margins around the artwork and scale all pages to the width of page 1",
+        )
+        page_tone = st.selectbox(
+            "Page Tone",
+            options=["color", "auto", "grayscale", "screentone"],
+            format_func={
+                "color": "Colour (as generated)",
+                "auto": "Auto (grayscale if black and white)",
+                "grayscale": "Grayscale",
+                "screentone": "Screentone (1-bit)",
+            }.get,
+            help="Black-and-white pages stored in grayscale or screentone take a fraction of the space of colour ones",
+        )
+        quantize_pages = st.checkbox(
+            "Compact palette",
+            value=False,
+            help="Store each page with the fewest gray levels or colours that keep it visually unchanged",
+        )
+        # Pages are kept as generated unless a step is picked
+        postprocess_options = None
+        if trim_pages or page_tone != "color" or quantize_pages:
+            postprocess_options = dict(trim=trim_pages, normalize=trim_pages, tone=page_tone, quantize=quantize_pages)
+
+        # Extra downloads
+        export_kinds = st.multiselect(
+            "Extra Downloads",
+            options=list(EXPORT_LABELS),
+            default=["cbz", "pdf"],
+            format_func=EXPORT_LABELS.get,
+            help="Additional files prepared after generation, besides the PNG comic",
+        )
+        export_format = st.selectbox(
+            "Download Image Format",
+            options=[name for name, image_format in IMAGE_FORMATS.items() if image_format.available],
+            index=1,
+            format_func=str.upper,
+            help="Encoding of the pages in the extra downloads. WebP and AVIF are much smaller than PNG; PDFs always use JPEG.",
+        )
+
         st.markdown("---")
 
         # Generate button
@@ -229,6 +383,22 @@ def main():
             "🎨 Generate Manga", type="primary", width="stretch"
         )
 
+        # Resume button for the last failed run of this session, if any
+        failed_run = st.session_state.get("failed_run")
+        resume_slot = st.empty()
+        resume_button = resume_slot.button(**RESUME_BUTTON) if failed_run else False
+
+        cache_stats = get_cache().stats()
+        st.caption(
+            f"♻️ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+            f"{cache_stats['bytes'] / 1e6:.1f} MB"
+        )
+        image_retry_stats = get_retry_policy().stats().get(IMAGE_MODEL, {})
+        st.caption(
+            f"🔁 Image requests: {image_retry_stats.get('attempts', 0)} sent, "
+            f"{image_retry_stats.get('retries', 0)} retried, {image_retry_stats.get('fatal', 0)} failed"
+        )
+
     # Main area
     col1, col2 = st.columns([1, 2])
 
@@ -237,6 +407,7 @@ def main():
         st.write(f"**Language:** {language}")
         st.write(f"**Image Resolution:** {image_size}")
         st.write(f"**Pages:** {num_pages}")
+        st.write(f"**Generation Mode:** {generation_mode.capitalize()}")
         st.write(f"**Theme:** {theme}")
         st.write(
             f"**Additional Instructions:** {additional_content if additional_content != 'up to you' else 'AI decides'}"
@@ -261,64 +432,59 @@ def main():
     st.markdown("---")
 
     # Generation process
-    if generate_button:
-        if not theme.strip():
+    if generate_button or resume_button:
+        if generate_button and not theme.strip():
             st.error("⚠️ Please enter a theme")
             return
 
+        postprocess = None
+        if postprocess_options is not None:
+            # Imported here so rendering the page never waits for NumPy
+            from src.postprocess import PostProcessOptions
+
+            postprocess = PostProcessOptions(**postprocess_options)
+        workspace = None
+        progress = StreamlitProgress()
         try:
             with st.spinner("Generating your manga..."):
-                output_file, image_files = generate_comic(
-                    num_pages, theme, additional_content, character_image, language, image_size
-                )
-
-            st.success("🎉 Manga generated successfully!")
-
-            # Display final combined comic
-            st.subheader("📖 Completed Manga")
-            final_image = Image.open(output_file)
-            st.image(final_image, width="stretch")
-
-            # Download button for full comic
-            with open(output_file, "rb") as file:
-                st.download_button(
-                    label="💾 Download Full Comic",
-                    data=file,
-                    file_name=output_file,
-                    mime="image/png",
-                    width="stretch",
-                )
-
-            st.markdown("---")
-
-            # Display individual pages
-            st.subheader("📄 Individual Pages")
-            cols = st.columns(min(num_pages, 4))
-
-            for idx, image_path in enumerate(image_files):
-                col_idx = idx % 4
-                with cols[col_idx]:
-                    page_image = Image.open(image_path)
-                    st.image(
-                        page_image,
-                        caption=f"Page {idx + 1}",
-                        width="stretch",
+                if resume_button:
+                    # Continue from the saved plot and pages of the failed run
+                    workspace = RunWorkspace(OUTPUT_DIR, run_id=failed_run)
+                    result = get_worker().resume(workspace, progress=progress, postprocess=postprocess)
+                else:
+                    workspace = RunWorkspace(OUTPUT_DIR) if SAVE_OUTPUT else None
+                    result = get_worker().generate(
+                        num_pages,
+                        theme,
+                        additional_content,
+                        character_image,
+                        language,
+                        image_size,
+                        workspace=workspace,
+                        progress=progress,
+                        mode=generation_mode,
+                        postprocess=postprocess,
                     )
+            st.session_state.pop("failed_run", None)
+            resume_slot.empty()
 
-                    # Individual download button
-                    with open(image_path, "rb") as file:
-                        st.download_button(
-                            label="Download",
-                            data=file,
-                            file_name=image_path,
-                            mime="image/png",
-                            key=f"download_{idx}",
-                            width="stretch",
-                        )
+            st.success("🎉 Manga generated successfully!")
+            progress.show_comic(result.comic, result.page_reports)
+            if export_kinds:
+                progress.show_exports(result.pages, export_kinds, export_format, theme, language)
 
         except Exception as e:
             st.error(f"❌ An error occurred: {str(e)}")
-            st.info("💡 Please try again. If the problem persists, try reducing the number of pages or simplifying your prompt.")
+            if workspace is not None:
+                # Completed pages are checkpointed in the workspace; offer to resume
+                if not failed_run:
+                    # The sidebar had no resume button in this run; add it now. When it
+                    # had one, that button resumes the run stored below on its next click.
+                    resume_slot.button(**RESUME_BUTTON)
+                st.session_state["failed_run"] = workspace.run_id
+                st.info("💡 Click **Resume Failed Run** in the sidebar to continue from the first missing page without regenerating finished pages.")
+            else:
+                st.info("💡 Please try again. If the problem persists, try reducing the number of pages or simplifying your prompt.")
             st.exception(e)
 
 
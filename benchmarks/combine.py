@@ -0,0 +1,80 @@
+"""
+Memory and time benchmark for combine_images_vertical.
+
+Each case runs in a fresh process so that peak RSS reflects that case alone.
+The streaming compositor is compared against the previous all-in-RAM approach.
+
+Usage:
+    python -m benchmarks.combine [--sizes 1K 2K 4K] [--pages 1 4 7]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+from src.backend import PAGE_SIZES, synthetic_page
+
+def _combine_in_memory(image_paths, output_path):
+    """The original implementation, kept here as the baseline."""
+    images = [Image.open(path).convert("RGBA") for path in image_paths]
+    widths, heights = zip(*(img.size for img in images))
+    combined_img = Image.new("RGBA", (max(widths), sum(heights)))
+    y_offset = 0
+    for img in images:
+        combined_img.paste(img, (0, y_offset))
+        y_offset += img.height
+    combined_img.save(output_path, "PNG")
+
+
+def _run_case(impl, image_paths, output_path, queue):
+    from src.combine import combine_images_vertical
+
+    combine = combine_images_vertical if impl == "streaming" else _combine_in_memory
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    combine(image_paths, output_path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak_kb - baseline_kb) / 1024, os.path.getsize(output_path)))
+
+
+def run_case(impl, image_paths, output_path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(impl, image_paths, output_path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=list(PAGE_SIZES), choices=list(PAGE_SIZES))
+    parser.add_argument("--pages", nargs="+", type=int, default=list(range(1, 8)))
+    args = parser.parse_args()
+
+    print(f"{'size':>4} {'pages':>5} {'impl':>10} {'time (s)':>9} {'peak RSS (MB)':>14} {'output (MB)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name in args.sizes:
+            page_path = os.path.join(tmp, f"page_{size_name}.png")
+            with open(page_path, "wb") as f:
+                f.write(synthetic_page(size_name))
+            for num_pages in args.pages:
+                image_paths = [page_path] * num_pages
+                for impl in ("in-memory", "streaming"):
+                    output_path = os.path.join(tmp, f"combined_{impl}.png")
+                    elapsed, peak_mb, output_bytes = run_case(impl, image_paths, output_path)
+                    print(
+                        f"{size_name:>4} {num_pages:>5} {impl:>10} {elapsed:>9.2f} "
+                        f"{peak_mb:>14.1f} {output_bytes / 1e6:>12.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
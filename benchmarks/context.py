@@ -0,0 +1,70 @@
+"""
+Request size and latency per page for the "chained" and "windowed" modes.
+
+A "chained" comic keeps one chat, which resends every earlier prompt and
+page image with each page, so requests grow with the page count. "windowed"
+sends the last --context-pages pages and a text summary instead. Both run on
+the offline FakeClient, with latency growing by --seconds-per-mb of request.
+Request bytes and durations are read from the page_call spans of the trace.
+
+Usage:
+    python -m benchmarks.context [--size 2K] [--pages 7] [--context-pages 2] [--seconds-per-mb 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from src.backend import PAGE_SIZES, FakeClient
+from src.engine import ComicEngine
+from src.metrics import Tracer
+
+
+def run(mode, args):
+    """Return {page: (request bytes, seconds)} of one comic generated in `mode`."""
+    client = FakeClient(plot_latency=0, image_latency=args.image_latency, seconds_per_mb=args.seconds_per_mb)
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, "traces.jsonl")
+        engine = ComicEngine(client, tracer=Tracer(trace_path, None), context_pages=args.context_pages)
+        asyncio.run(engine.generate(args.pages, "benchmark", image_size=args.size, mode=mode))
+        pages = {}
+        with open(trace_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["name"] == "page_call":
+                    pages[record["attrs"]["page"]] = (record["attrs"]["request_bytes"], record["duration"])
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="2K", choices=list(PAGE_SIZES))
+    parser.add_argument("--pages", type=int, default=7)
+    parser.add_argument("--context-pages", type=int, default=2, help="Previous pages sent in windowed mode")
+    parser.add_argument("--image-latency", type=float, default=0.5, help="Seconds per fake image call")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.5, help="Fake latency added per MB of request")
+    args = parser.parse_args()
+
+    # Warm up (the fake's page rendering, first use of the SDK types) outside the measured runs
+    run("windowed", argparse.Namespace(**{**vars(args), "pages": 1}))
+    chained = run("chained", args)
+    windowed = run("windowed", args)
+    print(f"{args.size}, {args.pages} pages, windowed with {args.context_pages} previous page(s)")
+    print(f"{'page':>4} {'chained (MB)':>13} {'(s)':>6} {'windowed (MB)':>14} {'(s)':>6}")
+    for page in range(1, args.pages + 1):
+        chained_bytes, chained_seconds = chained[page]
+        windowed_bytes, windowed_seconds = windowed[page]
+        print(
+            f"{page:>4} {chained_bytes / 1e6:>13.2f} {chained_seconds:>6.2f} "
+            f"{windowed_bytes / 1e6:>14.2f} {windowed_seconds:>6.2f}"
+        )
+    for label, pages in (("chained", chained), ("windowed", windowed)):
+        total_bytes = sum(sent for sent, _ in pages.values())
+        total_seconds = sum(seconds for _, seconds in pages.values())
+        print(f"{label}: {total_bytes / 1e6:.2f} MB sent, {total_seconds:.2f}s in page calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Size and time benchmark for the export formats in src.export.
+
+Every exporter is run with every image format on the same pages, and the
+output size is compared with the lossless PNG strip the app produces by
+default. Pages are synthetic unless --pages-dir points at a generated run
+(a directory containing page1_image.png, page2_image.png, ...).
+
+Usage:
+    python -m benchmarks.export [--sizes 1K 2K] [--pages 4] [--pages-dir output/<run>]
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from src.backend import PAGE_SIZES, synthetic_page
+from src.export import EXPORTERS, IMAGE_FORMATS, ExportPool, export_comic
+
+
+def load_pages(directory):
+    paths = glob.glob(os.path.join(directory, "page*_image.*"))
+    paths.sort(key=lambda path: int(re.search(r"page(\d+)_image", path).group(1)))
+    if not paths:
+        raise SystemExit(f"No page*_image.* files in {directory}")
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    return pages
+
+
+def synthetic_pages(size_name, num_pages):
+    """Synthetic pages with film grain, so they compress like rendered artwork rather than flat shapes."""
+    return [synthetic_page(size_name)] * num_pages
+
+
+def run(label, pages, kinds, formats, max_width):
+    baseline = export_comic(pages, "strip", "png").data
+    print(f"\n{label}: {len(pages)} pages, PNG strip {len(baseline) / 1e6:.2f} MB")
+    print(f"{'export':>7} {'format':>6} {'time (s)':>9} {'size (MB)':>10} {'vs PNG':>7}")
+    for kind in kinds:
+        for name in formats:
+            start = time.perf_counter()
+            try:
+                export = export_comic(pages, kind, name, max_width=max_width)
+            except ValueError as e:
+                print(f"{kind:>7} {name:>6} {'-':>9} {'-':>10} {'-':>7}  ({e})")
+                continue
+            elapsed = time.perf_counter() - start
+            size = len(export.data)
+            print(f"{kind:>7} {name:>6} {elapsed:>9.2f} {size / 1e6:>10.2f} {size / len(baseline):>6.0%}")
+            if kind == "pdf":
+                # PDF pages are always JPEG; one run is enough
+                break
+
+    # The same exports through the process pool, as the app runs them
+    pool_format = next((name for name in formats if name != "png"), formats[0])
+    pool = ExportPool()
+    try:
+        pool.submit(pages[:1], "pages", "png").result()  # Start the workers
+        start = time.perf_counter()
+        futures = [pool.submit(pages, kind, pool_format, max_width=max_width) for kind in kinds]
+        for future in futures:
+            future.result()
+        print(f"{', '.join(kinds)} as {pool_format} in the process pool: {time.perf_counter() - start:.2f}s")
+    finally:
+        pool.shutdown()
+
+
+def main():
+    available = [name for name, image_format in IMAGE_FORMATS.items() if image_format.available]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1K", "2K"], choices=list(PAGE_SIZES))
+    parser.add_argument("--pages", type=int, default=4, help="Number of synthetic pages")
+    parser.add_argument("--pages-dir", help="Benchmark the pages of a generated run instead")
+    parser.add_argument("--exports", nargs="+", default=list(EXPORTERS), choices=list(EXPORTERS))
+    parser.add_argument("--formats", nargs="+", default=available, choices=available)
+    parser.add_argument("--max-width", type=int, default=None, help="Downscale pages wider than this")
+    args = parser.parse_args()
+
+    if args.pages_dir:
+        run(args.pages_dir, load_pages(args.pages_dir), args.exports, args.formats, args.max_width)
+        return
+    for size_name in args.sizes:
+        run(size_name, synthetic_pages(size_name, args.pages), args.exports, args.formats, args.max_width)
+
+
+if __name__ == "__main__":
+    main()
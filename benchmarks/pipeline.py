@@ -0,0 +1,172 @@
+"""
+End-to-end benchmark of the generation pipeline against the offline FakeClient.
+
+Needs no network or API key, so it can run in CI. For each image size and
+generation mode, in a fresh process (so peak RSS reflects that case alone):
+    latency     `generate_comic` run --runs times in a row; p50/p95 per comic
+                and p50 of the plot, page call, split and combine stages
+    throughput  --concurrency comics at once through one ComicEngine
+    memory      peak RSS above the process baseline
+
+The fake's latencies set the floor; with --plot-latency 0 --image-latency 0
+the numbers are the pipeline's own overhead. split_pages and
+combine_images_vertical are also timed on their own.
+
+Usage:
+    python -m benchmarks.pipeline [--sizes 1K 2K] [--modes chained parallel] [--pages 4]
+    python -m benchmarks.pipeline --plot-latency 0 --image-latency 0 --json results.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+
+from src.backend import PAGE_SIZES, FakeClient, fake_plot, synthetic_page
+from src.combine import combine_images_vertical
+from src.engine import GENERATION_MODES, ComicEngine
+from src.image_buffer import ImageBuffer
+from src.metrics import Tracer, percentile
+from src.pipeline import generate_comic
+from src.prompt_splitter import split_pages
+from src.retry import RetryPolicy
+
+STAGES = ("plot", "page_call", "split", "combine")
+
+
+def make_client(args):
+    return FakeClient(
+        plot_latency=args.plot_latency,
+        image_latency=args.image_latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        empty_rate=args.empty_rate,
+        seed=args.seed,
+    )
+
+
+def _run_case(size_name, mode, args, queue):
+    synthetic_page(size_name)  # Rendered once; not part of the pipeline's memory
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    retry_policy = RetryPolicy(base_delay=args.retry_delay)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, "traces.jsonl")
+        tracer = Tracer(trace_path, None)
+        client = make_client(args)
+        latencies = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            generate_comic(
+                client, args.pages, "benchmark", image_size=size_name, mode=mode, retry_policy=retry_policy, tracer=tracer
+            )
+            latencies.append(time.perf_counter() - start)
+
+        stages = defaultdict(list)
+        with open(trace_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["name"] in STAGES and record["status"] == "ok":
+                    stages[record["name"]].append(record["duration"])
+
+    async def concurrent():
+        engine = ComicEngine(make_client(args), retry_policy=retry_policy)
+        await asyncio.gather(
+            *(engine.generate(args.pages, "benchmark", image_size=size_name, mode=mode) for _ in range(args.concurrency))
+        )
+
+    start = time.perf_counter()
+    asyncio.run(concurrent())
+    throughput = args.concurrency / (time.perf_counter() - start) * 60
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(
+        {
+            "size": size_name,
+            "mode": mode,
+            "pages": args.pages,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "stages": {name: percentile(values, 50) for name, values in stages.items()},
+            "comics_per_min": throughput,
+            "peak_rss_mb": (peak_kb - baseline_kb) / 1024,
+            "client_stats": dict(client.stats),
+        }
+    )
+
+
+def run_case(size_name, mode, args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(size_name, mode, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def time_components(sizes, num_pages, repeats=200):
+    """Time split_pages on a canned plot and combine_images_vertical on synthetic pages."""
+    results = {}
+    plot = fake_plot(num_pages)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        split_pages(plot)
+    results["split_pages_ms"] = (time.perf_counter() - start) / repeats * 1000
+    for size_name in sizes:
+        pages = [ImageBuffer(synthetic_page(size_name))] * num_pages
+        start = time.perf_counter()
+        combine_images_vertical(pages, io.BytesIO())
+        results[f"combine_{size_name}_s"] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1K", "2K"], choices=list(PAGE_SIZES))
+    parser.add_argument("--modes", nargs="+", default=list(GENERATION_MODES), choices=GENERATION_MODES)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3, help="Sequential comics per case")
+    parser.add_argument("--concurrency", type=int, default=4, help="Comics generated at once for throughput")
+    parser.add_argument("--plot-latency", type=float, default=0.5, help="Seconds for the fake plot stream")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="Seconds per fake image call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter as a fraction")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls failing with a 503")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="Fraction of calls answered without parts")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="Base retry backoff in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(
+        f"{'size':>4} {'mode':>8} {'p50 (s)':>8} {'p95 (s)':>8} "
+        + " ".join(f"{name + ' (s)':>14}" for name in STAGES)
+        + f" {'comics/min':>11} {'peak RSS (MB)':>14}"
+    )
+    for size_name in args.sizes:
+        for mode in args.modes:
+            result = run_case(size_name, mode, args)
+            results.append(result)
+            stages = " ".join(f"{result['stages'].get(name, 0):>14.3f}" for name in STAGES)
+            print(
+                f"{size_name:>4} {mode:>8} {result['p50']:>8.2f} {result['p95']:>8.2f} {stages} "
+                f"{result['comics_per_min']:>11.1f} {result['peak_rss_mb']:>14.1f}"
+            )
+
+    components = time_components(args.sizes, args.pages)
+    print(", ".join(f"{name}={value:.3f}" for name, value in components.items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "cases": results, "components": components}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
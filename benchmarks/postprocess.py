@@ -0,0 +1,63 @@
+"""
+Time and bytes saved by page post-processing, per page size and tone.
+
+Each case post-processes --pages synthetic pages from the offline backend
+(manga-like panels with film grain) the way the engine does, all submitted
+at once so they are processed concurrently, and reports the wall time and
+the page sizes before and after. Pages processed one at a time are timed too,
+to show what the concurrency buys on this machine.
+
+Usage:
+    python -m benchmarks.postprocess [--sizes 1K 2K] [--tones auto screentone] [--pages 4]
+"""
+
+import argparse
+import asyncio
+import time
+
+from src.backend import PAGE_SIZES, synthetic_page
+from src.image_buffer import ImageBuffer
+from src.postprocess import TONES, PagePostProcessor, PostProcessOptions
+
+
+async def process(pages, options, concurrent=True):
+    """Post-process `pages`; return the PageReports and the wall time."""
+    started = time.perf_counter()
+    postprocessor = PagePostProcessor(options)
+    for page_num, page in enumerate(pages, start=1):
+        postprocessor.submit(page_num, page)
+        if not concurrent:
+            await postprocessor.results()
+    _, reports = await postprocessor.results()
+    return reports, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1K", "2K"], choices=list(PAGE_SIZES))
+    parser.add_argument("--tones", nargs="+", default=list(TONES), choices=TONES)
+    parser.add_argument("--pages", type=int, default=4)
+    args = parser.parse_args()
+
+    print(
+        f"{'size':>4} {'tone':>10} {'mode':>4} {'page (MB)':>10} {'processed (MB)':>15} {'saved':>6} "
+        f"{'concurrent (s)':>15} {'one by one (s)':>15}"
+    )
+    for size in args.sizes:
+        pages = [ImageBuffer(synthetic_page(size)) for _ in range(args.pages)]
+        for tone in args.tones:
+            options = PostProcessOptions(tone=tone)
+            # Warm up (imports, codecs) outside the measured runs
+            asyncio.run(process(pages[:1], options))
+            reports, concurrent = asyncio.run(process(pages, options))
+            _, sequential = asyncio.run(process(pages, options, concurrent=False))
+            original = sum(report.original_bytes for report in reports) / len(reports)
+            processed = sum(report.processed_bytes for report in reports) / len(reports)
+            print(
+                f"{size:>4} {tone:>10} {reports[0].mode or '-':>4} {original / 1e6:>10.2f} {processed / 1e6:>15.2f} "
+                f"{1 - processed / original:>6.0%} {concurrent:>15.2f} {sequential:>15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
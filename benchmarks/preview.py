@@ -0,0 +1,79 @@
+"""
+Page-load benchmark for the result view of the Streamlit app.
+
+Compares what the browser has to download and decode to show a finished
+comic, before and after the preview pipeline:
+    before  every page and the combined PNG strip at full resolution
+    after   a thumbnail per page and the stacked display versions as the comic
+
+Decoding the images with Pillow stands in for the browser's render time.
+Preview generation is timed cold (empty cache) and warm (cached).
+
+Usage:
+    python -m benchmarks.preview [--sizes 1K 2K 4K] [--pages 7]
+"""
+
+import argparse
+import io
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.export import synthetic_pages
+from src.backend import PAGE_SIZES
+from src.cache import GenerationCache
+from src.engine import _combine
+from src.image_buffer import ImageBuffer
+from src.preview import PreviewGenerator
+
+
+def decode(images):
+    """Return (seconds, megapixels) to decode `images` (encoded bytes)."""
+    # The full strip is far above Pillow's decompression-bomb threshold
+    Image.MAX_IMAGE_PIXELS = None
+    start = time.perf_counter()
+    pixels = 0
+    for data in images:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            pixels += img.width * img.height
+    return time.perf_counter() - start, pixels / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=list(PAGE_SIZES), choices=list(PAGE_SIZES))
+    parser.add_argument("--pages", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'size':>4} {'view':>6} {'bytes (MB)':>11} {'megapixels':>11} {'decode (s)':>11} {'prepare (s)':>12}")
+    for size_name in args.sizes:
+        pages = [ImageBuffer(data) for data in synthetic_pages(size_name, args.pages)]
+        comic = _combine(pages)
+
+        before = [page.data for page in pages] + [comic.data]
+        elapsed, megapixels = decode(before)
+        total = sum(map(len, before)) / 1e6
+        print(f"{size_name:>4} {'before':>6} {total:>11.2f} {megapixels:>11.1f} {elapsed:>11.2f} {'-':>12}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            generator = PreviewGenerator(GenerationCache(tmp))
+            timings = []
+            for _ in ("cold", "warm"):
+                start = time.perf_counter()
+                # Distinct bytes per page, as generated pages would be
+                previews = [generator.page(ImageBuffer(page.data + bytes([n]))) for n, page in enumerate(pages)]
+                strip = generator.strip(previews)
+                timings.append(time.perf_counter() - start)
+
+        after = [preview.thumbnail.data for preview in previews] + [strip.data]
+        elapsed, megapixels = decode(after)
+        total = sum(map(len, after)) / 1e6
+        prepare = f"{timings[0]:.2f}/{timings[1]:.2f}"
+        print(f"{size_name:>4} {'after':>6} {total:>11.2f} {megapixels:>11.1f} {elapsed:>11.2f} {prepare:>12}")
+    print("prepare: preview generation with an empty / a warm cache")
+
+
+if __name__ == "__main__":
+    main()
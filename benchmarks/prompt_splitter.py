@@ -0,0 +1,183 @@
+"""
+Fuzz and throughput benchmark for the plot parser in src.prompt_splitter.
+
+The fuzz pass renders plots with randomly chosen heading variants, feeds them
+to PageStreamSplitter in random chunks and checks that the streamed pages,
+parse_pages and validate_pages agree with the plot that was generated. It
+also mutates plots (dropped, repeated and garbled headings, stray brackets,
+missing newlines) and checks that the parser never raises and that
+validation fails only with PlotFormatError.
+
+The throughput pass times parse_pages against the previous regex split on
+plots and pathological inputs of growing size; time per MB should stay flat.
+
+Usage:
+    python -m benchmarks.prompt_splitter [--iterations 2000] [--sizes 1 4 16] [--seed 0]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from src.prompt_splitter import PageStreamSplitter, PlotFormatError, parse_pages, validate_pages
+
+HEADING_VARIANTS = [
+    "[Page {n}] ({panels} panels)",
+    "**[Page {n}]**",
+    "**[Page {n}] ({panels} panels)**",
+    "Page {n}:",
+    "## Page {n}",
+    "### **Page {n}** - {title}",
+    "［Ｐａｇｅ　{wide}］",
+    "【Page {n}】",
+    "[ページ{n}]（{panels}コマ）",
+    "{n}ページ目",
+    "【第{n}ページ】",
+]
+_WIDE_DIGITS = str.maketrans("0123456789", "０１２３４５６７８９")
+
+
+def make_plot(rng, num_pages, panels=5, preamble=True):
+    """Render a plot in the shape the plot model produces, with random heading variants."""
+    lines = []
+    if preamble:
+        lines += ["Title: The Last Train", "Hook: A ticket that should not exist.", ""]
+    for n in range(1, num_pages + 1):
+        heading = rng.choice(HEADING_VARIANTS)
+        lines.append(heading.format(n=n, panels=panels, title="Arrival", wide=str(n).translate(_WIDE_DIGITS)))
+        for panel in range(1, panels + 1):
+            lines.append(f"Panel {panel}: Wide shot of the platform at dusk, rain on the rails.")
+            lines.append(f'  Dialogue: "Is this page {n}?" 「ページ{n}のセリフ」')
+            lines.append("  SFX: ガタンゴトン")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def random_chunks(rng, text):
+    """Split `text` at random points, the way a streamed response arrives."""
+    chunks = []
+    i = 0
+    while i < len(text):
+        size = rng.choice((1, 2, 3, 7, 16, 64, 512))
+        chunks.append(text[i : i + size])
+        i += size
+    return chunks
+
+
+def stream_parse(chunks):
+    splitter = PageStreamSplitter()
+    pages = []
+    for chunk in chunks:
+        pages += splitter.feed(chunk)
+    return pages + splitter.close()
+
+
+def mutate(rng, text):
+    """Apply one random malformation to a plot."""
+    lines = text.split("\n")
+    kind = rng.choice(("drop", "repeat", "swap", "garble", "brackets", "flatten", "crlf", "truncate"))
+    headings = [i for i, line in enumerate(lines) if parse_pages(line)]
+    if kind == "drop" and headings:
+        del lines[rng.choice(headings)]
+    elif kind == "repeat" and headings:
+        i = rng.choice(headings)
+        lines.insert(rng.randrange(len(lines)), lines[i])
+    elif kind == "swap" and len(headings) > 1:
+        i, j = rng.sample(headings, 2)
+        lines[i], lines[j] = lines[j], lines[i]
+    elif kind == "garble" and headings:
+        i = rng.choice(headings)
+        lines[i] = "".join(rng.sample(lines[i], len(lines[i])))
+    elif kind == "brackets":
+        lines.insert(rng.randrange(len(lines) + 1), rng.choice(("[", "【", "**[Page", "[Page ", "“", "「")) * 1000)
+    elif kind == "flatten":
+        return " ".join(lines)
+    elif kind == "crlf":
+        return "\r\n".join(lines)
+    elif kind == "truncate":
+        return text[: rng.randrange(len(text) + 1)]
+    return "\n".join(lines)
+
+
+def fuzz(iterations, seed):
+    rng = random.Random(seed)
+    rejected = 0
+    for _ in range(iterations):
+        num_pages = rng.randint(1, 7)
+        text = make_plot(rng, num_pages, panels=rng.randint(1, 8), preamble=rng.random() < 0.5)
+
+        pages = parse_pages(text)
+        assert [page.number for page in pages] == list(range(1, num_pages + 1)), text
+        assert all(len(page.panels) >= 1 and page.dialogue for page in pages), text
+        validate_pages(pages, num_pages)
+        streamed = stream_parse(random_chunks(rng, text))
+        assert [page.to_dict() for page in streamed] == [page.to_dict() for page in pages]
+
+        broken = mutate(rng, text)
+        pages = parse_pages(broken)
+        streamed = stream_parse(random_chunks(rng, broken))
+        assert [page.to_dict() for page in streamed] == [page.to_dict() for page in pages]
+        try:
+            validate_pages(pages, num_pages)
+        except PlotFormatError:
+            rejected += 1
+    return rejected
+
+
+def _split_pages_regex(text):
+    """The original implementation, kept here as the baseline."""
+    pages = {}
+    for block in re.split(r"(?=\[Page\s+\d+\])", text):
+        block = block.strip()
+        m = re.match(r"\[Page\s+(\d+)\]", block)
+        if m:
+            pages[f"page{m.group(1)}"] = block
+    return pages
+
+
+def _timed(func, text):
+    start = time.perf_counter()
+    func(text)
+    return time.perf_counter() - start
+
+
+def throughput(sizes_mb, seed):
+    rng = random.Random(seed)
+    unit = make_plot(rng, 7)
+    inputs = {
+        "plot": lambda size: (unit * (size // len(unit) + 1))[:size],
+        "one line": lambda size: ("* [Page x] " * (size // 11 + 1))[:size],
+        "brackets": lambda size: "\n".join(["[" * 1000] * (size // 1001 + 1))[:size],
+        "decorated": lambda size: "\n".join(["* " * 500] * (size // 1001 + 1))[:size],
+    }
+    print(f"{'input':>10} {'MB':>4} {'parser (s)':>11} {'s/MB':>6} {'regex (s)':>10} {'pages':>6}")
+    for name, make in inputs.items():
+        for size_mb in sizes_mb:
+            text = make(size_mb * 1_000_000)
+            elapsed = _timed(parse_pages, text)
+            baseline = _timed(_split_pages_regex, text)
+            pages = len(parse_pages(text))
+            print(
+                f"{name:>10} {size_mb:>4} {elapsed:>11.3f} {elapsed / size_mb:>6.3f} {baseline:>10.3f} {pages:>6}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="Number of fuzzed plots")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 4, 16], help="Input sizes in MB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rejected = fuzz(args.iterations, args.seed)
+    print(
+        f"fuzz: {args.iterations} plots parsed identically in one piece and streamed; "
+        f"{rejected} mutated plots rejected with PlotFormatError ({time.perf_counter() - start:.1f}s)"
+    )
+    throughput(args.sizes, args.seed)
+
+
+if __name__ == "__main__":
+    main()
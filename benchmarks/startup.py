@@ -0,0 +1,110 @@
+"""
+Startup and rerun benchmark for the Streamlit app.
+
+Each case runs the app with Streamlit's AppTest in a fresh process:
+    import      importing Streamlit itself (paid by the server, not the app)
+    first run   the first script run of the process: the app's imports and the first render
+    rerun       one script run after changing a sidebar setting (p50/p95 over --reruns)
+    first job   the first 1-page comic on the offline fake backend with zero latency,
+                --think-time seconds after the first run, so it shows what is
+                still being set up when the user clicks Generate
+
+Cases are the lazy default and the pre-warmed mode (COMIC_PREWARM=true).
+Another version of the app can be compared with --script (e.g. an older app.py
+checked out next to this one).
+
+Usage:
+    python -m benchmarks.startup [--reruns 20] [--think-time 2] [--script app.py]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from src.export import get_export_pool
+from src.metrics import percentile
+
+
+def _run_case(script, prewarm, args, queue):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            COMIC_BACKEND="fake",
+            COMIC_FAKE_PLOT_LATENCY="0",
+            COMIC_FAKE_IMAGE_LATENCY="0",
+            COMIC_PREWARM="true" if prewarm else "false",
+            COMIC_OUTPUT_DIR=os.path.join(tmp, "output"),
+            COMIC_CACHE_DIR=os.path.join(tmp, "cache"),
+            COMIC_PREVIEW_CACHE_DIR=os.path.join(tmp, "previews"),
+            COMIC_TRACE_FILE="",
+            COMIC_METRICS_FILE="",
+        )
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+        start = time.perf_counter()
+        from streamlit.testing.v1 import AppTest
+
+        import_time = time.perf_counter() - start
+
+        at = AppTest.from_file(os.path.abspath(script), default_timeout=300)
+        start = time.perf_counter()
+        at.run()
+        first_run = time.perf_counter() - start
+
+        reruns = []
+        for i in range(args.reruns):
+            at.sidebar.slider[0].set_value(1 + i % 7)
+            start = time.perf_counter()
+            at.run()
+            reruns.append(time.perf_counter() - start)
+
+        time.sleep(args.think_time)
+        at.sidebar.slider[0].set_value(1)
+        at.sidebar.multiselect[0].set_value([])
+        [button for button in at.button if "Generate" in button.label][0].click()
+        start = time.perf_counter()
+        at.run()
+        first_job = time.perf_counter() - start
+        failed = [element.value for element in at.exception]
+        # Stop the export workers started by the app, which this process would otherwise wait for on exit
+        get_export_pool().shutdown()
+
+    queue.put((import_time, first_run, reruns, first_job, failed))
+
+
+def run_case(script, prewarm, args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(script, prewarm, args, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode:
+        raise RuntimeError(f"benchmark process exited with code {proc.exitcode}")
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="app.py", help="App script to benchmark")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--think-time", type=float, default=2.0, help="Seconds between the first run and Generate")
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':>8} {'import (s)':>11} {'first run (s)':>14} {'rerun p50 (ms)':>15} "
+        f"{'rerun p95 (ms)':>15} {'first job (s)':>14}"
+    )
+    for prewarm in (False, True):
+        import_time, first_run, reruns, first_job, failed = run_case(args.script, prewarm, args)
+        mode = "prewarm" if prewarm else "lazy"
+        print(
+            f"{mode:>8} {import_time:>11.2f} {first_run:>14.2f} {percentile(reruns, 50) * 1000:>15.1f} "
+            f"{percentile(reruns, 95) * 1000:>15.1f} {first_job:>14.2f}"
+        )
+        if failed:
+            print(f"  first job failed: {failed[0]}")
+
+
+if __name__ == "__main__":
+    main()
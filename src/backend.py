@@ -0,0 +1,387 @@
+"""
+Model backends the engine can run against.
+
+The engine only uses the part of a google-genai Client that it needs:
+    client.aio.models.generate_content(model=, contents=, config=)
+    client.aio.models.generate_content_stream(model=, contents=, config=)
+    client.aio.chats.create(model=, config=).send_message(contents)
+and the responses' `parts`, `text`, `candidates`, `prompt_feedback` and
+`usage_metadata`. Any object providing the same surface can stand in for
+the real client.
+
+`FakeClient` is such a backend that never touches the network: it streams a
+canned plot and returns synthetic 1K/2K/4K pages after a configurable
+latency, failing or answering without parts at configurable, seeded rates.
+It drives benchmarks and lets the app and CLI run offline.
+
+Select the backend with COMIC_BACKEND ("gemini", the default, or "fake").
+"""
+
+import asyncio
+import functools
+import io
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+
+from google.genai import errors, types
+from PIL import Image, ImageDraw
+
+BACKENDS = ("gemini", "fake")
+
+# Output dimensions of gemini-3-pro-image-preview for a 3:4 aspect ratio
+PAGE_SIZES = {
+    "1K": (896, 1200),
+    "2K": (1792, 2400),
+    "4K": (3584, 4800),
+}
+
+# Output tokens billed per generated image
+_IMAGE_OUTPUT_TOKENS = {"1K": 1120, "2K": 1120, "4K": 2000}
+# Input tokens billed per reference image
+_IMAGE_INPUT_TOKENS = 560
+
+_PAGE_HEADING = re.compile(r"\[Page (\d+)\]")
+
+
+def create_client(backend=None):
+    """
+    Create the client for `backend`, or for COMIC_BACKEND if it is omitted.
+
+    :param backend: "gemini" (google-genai Client, configured from the environment) or "fake"
+    """
+    backend = backend or os.getenv("COMIC_BACKEND", "gemini")
+    if backend == "gemini":
+        from google import genai
+
+        return genai.Client()
+    if backend == "fake":
+        return FakeClient.from_env()
+    raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+class FakeClient:
+    """
+    Offline stand-in for google.genai.Client with deterministic behaviour.
+
+    Both the synchronous (`models`, `chats`) and the asynchronous (`aio`)
+    surfaces are provided. Failures and empty responses are drawn from a
+    random generator seeded with `seed`, so a run with the same requests in
+    the same order sees the same faults. Counters of calls, faults and bytes
+    sent are kept per model in `stats`.
+    """
+
+    def __init__(
+        self,
+        plot_latency=0.5,
+        image_latency=1.0,
+        jitter=0.0,
+        failure_rate=0.0,
+        empty_rate=0.0,
+        stream_chunks=20,
+        seconds_per_mb=0.0,
+        seed=0,
+    ):
+        """
+        :param plot_latency: Seconds until the whole plot has streamed
+        :param image_latency: Seconds per image response
+        :param jitter: Latencies vary uniformly by up to this fraction
+        :param failure_rate: Probability that a call fails with a 503 (retryable) error
+        :param empty_rate: Probability that a call returns a response without parts
+        :param stream_chunks: Number of chunks the plot is streamed in
+        :param seconds_per_mb: Latency added per MB of request, standing in for upload and input processing
+        :param seed: Seed of the fault and jitter generator
+        """
+        self.plot_latency = plot_latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.empty_rate = empty_rate
+        self.stream_chunks = stream_chunks
+        self.seconds_per_mb = seconds_per_mb
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _Models(self)
+        self.chats = _Chats(self)
+        self.aio = _AsyncClient(self)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a client configured by COMIC_FAKE_PLOT_LATENCY, COMIC_FAKE_IMAGE_LATENCY,
+        COMIC_FAKE_SECONDS_PER_MB, COMIC_FAKE_FAILURE_RATE, COMIC_FAKE_EMPTY_RATE and COMIC_FAKE_SEED.
+        """
+        return cls(
+            plot_latency=float(os.getenv("COMIC_FAKE_PLOT_LATENCY", "0.5")),
+            image_latency=float(os.getenv("COMIC_FAKE_IMAGE_LATENCY", "1.0")),
+            seconds_per_mb=float(os.getenv("COMIC_FAKE_SECONDS_PER_MB", "0")),
+            failure_rate=float(os.getenv("COMIC_FAKE_FAILURE_RATE", "0")),
+            empty_rate=float(os.getenv("COMIC_FAKE_EMPTY_RATE", "0")),
+            seed=int(os.getenv("COMIC_FAKE_SEED", "0")),
+        )
+
+    def _call(self, model, contents, latency):
+        """
+        Account for one request and decide its fate.
+
+        :return: Tuple of (latency in seconds, empty) where `empty` means the
+                 response has no parts
+        :raises errors.ServerError: If the call is chosen to fail
+        """
+        sent = _request_bytes(contents)
+        with self._lock:
+            self.stats[f"{model}.calls"] += 1
+            self.stats[f"{model}.request_bytes"] += sent
+            fail = self._rng.random() < self.failure_rate
+            empty = not fail and self._rng.random() < self.empty_rate
+            latency *= 1 + self.jitter * (2 * self._rng.random() - 1)
+            latency += sent / 1e6 * self.seconds_per_mb
+            if fail:
+                self.stats[f"{model}.failures"] += 1
+            elif empty:
+                self.stats[f"{model}.empty"] += 1
+        if fail:
+            raise errors.ServerError(
+                503, {"error": {"code": 503, "message": "The model is overloaded (fake).", "status": "UNAVAILABLE"}}
+            )
+        return latency, empty
+
+    def _plot_chunks(self, model, contents):
+        """Return (seconds per chunk, chunk responses) of the plot for `contents`."""
+        latency, empty = self._call(model, contents, self.plot_latency)
+        if empty:
+            return latency, [_response([], _usage(contents, 0))]
+        text = fake_plot(_prompt_pages(contents))
+        size = max(1, math.ceil(len(text) / self.stream_chunks))
+        pieces = [text[i : i + size] for i in range(0, len(text), size)]
+        chunks = [_response([types.Part.from_text(text=piece)]) for piece in pieces]
+        # Token counts arrive with the last chunk, as with the real API
+        chunks[-1].usage_metadata = _usage(contents, len(text) // 4)
+        return latency / len(chunks), chunks
+
+    def _plot(self, model, contents):
+        """Return (latency, response) with the whole plot."""
+        delay, chunks = self._plot_chunks(model, contents)
+        text = "".join(chunk.text or "" for chunk in chunks)
+        parts = [types.Part.from_text(text=text)] if text else []
+        return delay * len(chunks), _response(parts, chunks[-1].usage_metadata)
+
+    def _image(self, model, contents, config):
+        """Return (latency, response) with a synthetic page for `config.image_config`."""
+        image_config = getattr(config, "image_config", None)
+        size_name = getattr(image_config, "image_size", None) or "1K"
+        aspect_ratio = getattr(image_config, "aspect_ratio", None) or "3:4"
+        latency, empty = self._call(model, contents, self.image_latency)
+        if empty:
+            return latency, _response([], _usage(contents, 0))
+        with self._lock:
+            self.stats[f"{model}.images"] += 1
+            serial = self.stats[f"{model}.images"]
+        # Every page gets distinct bytes, as generated pages would
+        data = _stamp_png(synthetic_page(size_name, aspect_ratio), f"fake page {serial}")
+        part = types.Part.from_bytes(data=data, mime_type="image/png")
+        return latency, _response([part], _usage(contents, _IMAGE_OUTPUT_TOKENS.get(size_name, 1120)))
+
+    def _generate(self, model, contents, config):
+        if _wants_image(config):
+            return self._image(model, contents, config)
+        return self._plot(model, contents)
+
+
+class _Models:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        latency, response = self._client._generate(model, contents, config)
+        time.sleep(latency)
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        delay, chunks = self._client._plot_chunks(model, contents)
+        for chunk in chunks:
+            time.sleep(delay)
+            yield chunk
+
+
+class _AsyncModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        latency, response = self._client._generate(model, contents, config)
+        await asyncio.sleep(latency)
+        return response
+
+    async def generate_content_stream(self, model, contents, config=None):
+        delay, chunks = self._client._plot_chunks(model, contents)
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+
+        return stream()
+
+
+class _Chat:
+    """A chat session: every message is sent along with the whole history, as the real chat does."""
+
+    def __init__(self, client, model, config):
+        self._client = client
+        self._model = model
+        self._config = config
+        self._history = []
+
+    def _send(self, contents):
+        contents = contents if isinstance(contents, list) else [contents]
+        request = self._history + contents
+        latency, response = self._client._generate(self._model, request, self._config)
+        if response.parts:
+            self._history = request + list(response.parts)
+        return latency, response
+
+    def send_message(self, contents):
+        latency, response = self._send(contents)
+        time.sleep(latency)
+        return response
+
+
+class _AsyncChat(_Chat):
+    async def send_message(self, contents):
+        latency, response = self._send(contents)
+        await asyncio.sleep(latency)
+        return response
+
+
+class _Chats:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, config=None):
+        return _Chat(self._client, model, config)
+
+
+class _AsyncChats(_Chats):
+    def create(self, model, config=None):
+        return _AsyncChat(self._client, model, config)
+
+
+class _AsyncClient:
+    def __init__(self, client):
+        self.models = _AsyncModels(client)
+        self.chats = _AsyncChats(client)
+
+
+def fake_plot(num_pages):
+    """A canned plot with `num_pages` well-formed page blocks."""
+    blocks = []
+    for page in range(1, num_pages + 1):
+        blocks.append(
+            f"[Page {page}] (3 panels)\n"
+            f"Title: Chapter {page}\n"
+            f"Panel 1: Wide shot of the city at dusk, page {page}.\n"
+            f'Hero: "We have {num_pages - page} pages left to save the day."\n'
+            f"Panel 2: Close-up of the hero's determined face.\n"
+            f"Panel 3: The rival appears in the doorway.\n"
+            f'Rival: "Not so fast!"\n'
+        )
+    return "\n".join(blocks)
+
+
+@functools.lru_cache(maxsize=8)
+def synthetic_page(size_name="1K", aspect_ratio="3:4"):
+    """
+    Encode a synthetic manga-like page (panels, speech bubbles, film grain) as PNG.
+
+    Pages have the pixel count of `size_name` at `aspect_ratio`, and the grain
+    makes them compress like rendered artwork. Results are cached per size.
+    """
+    base_width, base_height = PAGE_SIZES.get(size_name, PAGE_SIZES["1K"])
+    ratio_width, ratio_height = (int(value) for value in aspect_ratio.split(":"))
+    scale = math.sqrt(base_width * base_height / (ratio_width * ratio_height))
+    width, height = round(ratio_width * scale), round(ratio_height * scale)
+
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    rows, cols = 4, 2
+    for r in range(rows):
+        for c in range(cols):
+            x0 = c * width // cols + 10
+            y0 = r * height // rows + 10
+            x1 = (c + 1) * width // cols - 10
+            y1 = (r + 1) * height // rows - 10
+            draw.rectangle((x0, y0, x1, y1), outline=(0, 0, 0), width=max(2, width // 300))
+            draw.ellipse((x0 + 20, y0 + 20, x0 + (x1 - x0) // 2, y0 + (y1 - y0) // 2), fill=(250, 250, 250))
+    grain = Image.effect_noise((width, height), 24).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(img, grain, 0.15).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _stamp_png(data, text):
+    """Insert a tEXt chunk before IEND, changing the bytes but not the pixels."""
+    payload = b"Comment\x00" + text.encode("latin-1")
+    chunk = struct.pack(">I", len(payload)) + b"tEXt" + payload + struct.pack(">I", zlib.crc32(b"tEXt" + payload))
+    return data[:-12] + chunk + data[-12:]
+
+
+def _wants_image(config):
+    modalities = getattr(config, "response_modalities", None) or []
+    return "IMAGE" in modalities
+
+
+def _prompt_pages(contents):
+    """Number of pages the plot prompt asks for, read from its output format section."""
+    text = " ".join(part for part in _as_list(contents) if isinstance(part, str))
+    numbers = [int(number) for number in _PAGE_HEADING.findall(text)]
+    return max(numbers, default=4)
+
+
+def _as_list(contents):
+    return contents if isinstance(contents, list) else [contents]
+
+
+def _request_bytes(contents):
+    """Bytes of text and inline data in a request, as they would be sent."""
+    total = 0
+    for part in _as_list(contents):
+        if isinstance(part, str):
+            total += len(part.encode("utf-8"))
+        elif getattr(part, "inline_data", None) is not None:
+            total += len(part.inline_data.data)
+        elif getattr(part, "text", None):
+            total += len(part.text.encode("utf-8"))
+    return total
+
+
+def _usage(contents, output_tokens):
+    prompt_tokens = 0
+    for part in _as_list(contents):
+        if isinstance(part, str):
+            prompt_tokens += len(part) // 4
+        elif getattr(part, "inline_data", None) is not None:
+            prompt_tokens += _IMAGE_INPUT_TOKENS
+        elif getattr(part, "text", None):
+            prompt_tokens += len(part.text) // 4
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+
+
+def _response(parts, usage_metadata=None):
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(content=types.Content(role="model", parts=parts), finish_reason=types.FinishReason.STOP)
+        ],
+        usage_metadata=usage_metadata,
+    )
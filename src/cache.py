@@ -0,0 +1,188 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from src.image_buffer import ImageBuffer
+
+
+class GenerationCache:
+    """
+    Persistent, content-addressed cache for model outputs (plot text and page images).
+
+    Entries are stored as files named after a SHA-256 hash of everything that
+    determines a model response: the model name, the request contents
+    (prompt text and reference-image bytes) and the generation config.
+    The cache is bounded both by total size and by entry age; when the size
+    budget is exceeded the least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=7 * 24 * 3600):
+        """
+        :param directory: Directory where cache entries are stored (created if missing)
+        :param max_bytes: Maximum total size of all entries, in bytes
+        :param max_age: Maximum age of an entry in seconds before it is considered stale
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (entries, bytes) as of the last eviction pass, so stats() needn't walk the directory
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Create the cache configured by COMIC_CACHE_DIR / COMIC_CACHE_MAX_MB / COMIC_CACHE_MAX_AGE_HOURS."""
+        return cls(
+            os.getenv("COMIC_CACHE_DIR", ".cache/generations"),
+            max_bytes=int(os.getenv("COMIC_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+            max_age=float(os.getenv("COMIC_CACHE_MAX_AGE_HOURS", "168")) * 3600,
+        )
+
+    @staticmethod
+    def make_key(model, contents, config=None):
+        """
+        Build the cache key for a model request.
+
+        :param model: Model name, e.g. "gemini-3-pro-image-preview"
+        :param contents: Prompt string, image, bytes, or a list of those
+        :param config: Optional generation config (e.g. types.ImageConfig)
+        :return: Hex digest identifying the request
+        """
+        digest = hashlib.sha256()
+        for item in (model, contents, config):
+            _update_digest(digest, item)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Return the cached bytes for `key`, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                if time.time() - stat.st_mtime > self.max_age:
+                    os.remove(path)
+                    self.evictions += 1
+                    raise FileNotFoundError(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            # Refresh access time so size-based eviction is least-recently-used
+            os.utime(path, (time.time(), stat.st_mtime))
+            self.hits += 1
+            return data
+
+    def get_text(self, key):
+        data = self.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def put(self, key, data):
+        """Store `data` (bytes or str) under `key` and enforce the size/age limits."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        total = 0
+        for path, stat in self._entries():
+            if now - stat.st_mtime > self.max_age:
+                self._remove(path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        count = len(entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            count -= 1
+        self._size = (count, total)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        """
+        Return hit/miss/eviction counters and the on-disk size.
+
+        The size is measured by every write; only the first call measures it
+        itself, so this is cheap enough to call on every Streamlit rerun.
+        """
+        with self._lock:
+            if self._size is None:
+                entries = [stat.st_size for _, stat in self._entries()]
+                self._size = (len(entries), sum(entries))
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._size[0],
+                "bytes": self._size[1],
+            }
+
+
+def _update_digest(digest, item):
+    """Feed a type-tagged, unambiguous encoding of `item` into `digest`."""
+    if item is None:
+        digest.update(b"N")
+    elif isinstance(item, str):
+        data = item.encode("utf-8")
+        digest.update(b"S%d:" % len(data) + data)
+    elif isinstance(item, (bytes, bytearray)):
+        digest.update(b"B%d:" % len(item) + bytes(item))
+    elif isinstance(item, ImageBuffer):
+        _update_digest(digest, item.data)
+    elif isinstance(item, Image.Image):
+        header = f"{item.mode}:{item.size[0]}x{item.size[1]}".encode()
+        digest.update(b"I" + header)
+        _update_digest(digest, item.tobytes())
+    elif isinstance(item, (list, tuple)):
+        digest.update(b"L%d:" % len(item))
+        for sub in item:
+            _update_digest(digest, sub)
+    elif getattr(item, "image_bytes", None) is not None:
+        # google.genai types.Image, as returned by Part.as_image()
+        _update_digest(digest, item.image_bytes)
+    elif hasattr(item, "model_dump_json"):
+        # google.genai pydantic types such as ImageConfig
+        _update_digest(digest, type(item).__name__ + item.model_dump_json(exclude_none=True))
+    else:
+        _update_digest(digest, repr(item))
@@ -0,0 +1,125 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+from src.image_buffer import ImageBuffer
+from src.workspace import RUN_MARKER
+
+_JOB_FILE = RUN_MARKER
+_PLOT_FILE = "plot.txt"
+_PAGES_FILE = "pages.json"
+
+
+class JobCheckpoint:
+    """
+    Records the progress of a generation job inside its RunWorkspace.
+
+    The job parameters, the plot text, the page prompts and every completed
+    page are written as soon as they exist, so a failed job can be resumed
+    from the first missing page instead of starting over.
+    """
+
+    def __init__(self, workspace):
+        """
+        :param workspace: RunWorkspace the checkpoint files are stored in
+        """
+        self.workspace = workspace
+
+    @staticmethod
+    def job_params(num_pages, theme, additional_content, character_image, language, image_size, mode):
+        """Parameters that identify a job; a checkpoint is only reused when they match."""
+        return {
+            "num_pages": num_pages,
+            "theme": theme,
+            "additional_content": additional_content,
+            "language": language,
+            "image_size": image_size,
+            "mode": mode,
+            "reference_sha256": hashlib.sha256(character_image.data).hexdigest() if character_image else None,
+        }
+
+    def _write(self, filename, data):
+        # Write atomically so an interrupted job never leaves a truncated file behind
+        path = self.workspace.path(filename)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, filename):
+        try:
+            with open(self.workspace.path(filename), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def start(self, params, character_image=None):
+        """
+        Record the job parameters. Any saved progress from a job with different
+        parameters is discarded.
+        """
+        if self.load_params() != params:
+            self.clear()
+            if character_image is not None:
+                self._write(f"reference{character_image.extension}", character_image.data)
+            self._write(_JOB_FILE, json.dumps(params, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def clear(self):
+        """Remove all checkpoint files and generated pages from the workspace."""
+        self._remove(_JOB_FILE, _PLOT_FILE, _PAGES_FILE, "reference.*", "page*_image.*", "*_page_comic.png")
+
+    def clear_pages(self):
+        """
+        Remove the saved pages. Called before a new plot is generated: pages
+        saved while an abandoned plot was streaming belong to that plot only.
+        """
+        self._remove("page*_image.*", "*_page_comic.png")
+
+    def _remove(self, *patterns):
+        for pattern in patterns:
+            for path in glob.glob(self.workspace.path(pattern)):
+                os.remove(path)
+
+    def load_params(self):
+        data = self._read(_JOB_FILE)
+        return json.loads(data) if data is not None else None
+
+    def load_character_image(self):
+        paths = glob.glob(self.workspace.path("reference.*"))
+        if not paths:
+            return None
+        with open(paths[0], "rb") as f:
+            return ImageBuffer(f.read())
+
+    def save_plot(self, plot_text, page_specs):
+        """Save the plot and its parsed pages (a list of PageSpecs, written for inspection)."""
+        self._write(_PLOT_FILE, plot_text.encode("utf-8"))
+        pages = [page.to_dict() for page in page_specs]
+        self._write(_PAGES_FILE, json.dumps(pages, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def load_plot(self):
+        """Return the saved plot text, or None if the plot was not reached yet."""
+        plot_text = self._read(_PLOT_FILE)
+        # pages.json is written last, so its presence marks a complete plot
+        if plot_text is None or self._read(_PAGES_FILE) is None:
+            return None
+        return plot_text.decode("utf-8")
+
+    def save_page(self, page_num, page_image):
+        self._write(f"page{page_num}_image{page_image.extension}", page_image.data)
+
+    def load_pages(self):
+        """Return a dict of page number -> ImageBuffer for every completed page."""
+        pages = {}
+        for path in glob.glob(self.workspace.path("page*_image.*")):
+            name = os.path.basename(path)
+            page_num = name[len("page") : name.index("_image")]
+            if page_num.isdigit():
+                with open(path, "rb") as f:
+                    pages[int(page_num)] = ImageBuffer(f.read())
+        return pages
+
+    def save_comic(self, comic, num_pages):
+        self._write(f"{num_pages}_page_comic.png", comic.data)
@@ -0,0 +1,236 @@
+"""
+Headless batch entry point: generate many comics from a JSONL or CSV job file.
+
+Each job has the fields:
+    theme               (required)
+    id                  (optional, defaults to the line number)
+    language            "English" or "Japanese" (default: English)
+    pages               1–7 (default: 4)
+    size                "1K", "2K" or "4K" (default: 1K)
+    additional_content  (optional)
+    reference_image     path to a character reference image (optional)
+    mode                "chained", "windowed" or "parallel" (default: chained)
+
+Each job is checkpointed in <output-dir>/<job file name>/<id>/. Running the same
+job file again resumes unfinished jobs from their first missing page and
+reuses finished ones, unless --fresh is given. Extra downloads requested with
+--export are written next to the pages. With --postprocess the pages are
+trimmed, aligned and stored in grayscale or with a small palette where possible
+before they are combined and exported; the checkpointed pages stay as generated.
+
+Usage:
+    python -m src.cli jobs.jsonl --concurrency 4 --max-in-flight 6
+    python -m src.cli jobs.jsonl --export cbz pdf --export-format webp
+    python -m src.cli jobs.jsonl --postprocess --tone screentone
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.backend import BACKENDS, create_client
+from src.cache import GenerationCache
+from src.checkpoint import JobCheckpoint
+from src.engine import ComicEngine, ProgressCallback
+from src.export import EXPORTERS, IMAGE_FORMATS, export_options, get_export_pool
+from src.image_buffer import ImageBuffer
+from src.metrics import Tracer
+from src.postprocess import TONES, PostProcessOptions
+from src.retry import RetryPolicy
+from src.scheduler import RequestScheduler
+from src.workspace import RunWorkspace
+
+
+def load_jobs(path):
+    """Read jobs from a .jsonl or .csv file into a list of dicts with an `id`."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs = []
+    for index, row in enumerate(rows, start=1):
+        if not str(row.get("theme") or "").strip():
+            raise ValueError(f"Job {index} in {path} has no theme")
+        row = {key: value for key, value in row.items() if value not in (None, "")}
+        row.setdefault("id", str(index))
+        jobs.append(row)
+    return jobs
+
+
+class _JobProgress(ProgressCallback):
+    """Prints pipeline events prefixed with the job id."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def status(self, message, percent):
+        print(f"[{self.job_id}] {percent:3d}% {message}", flush=True)
+
+    def retry(self, page_num, attempt, max_retries, error):
+        print(f"[{self.job_id}] Retrying page {page_num} ({attempt}/{max_retries}) due to: {error}", flush=True)
+
+
+async def run_job(engine, job, output_dir, fresh=False, exports=(), export_format="jpeg", postprocess=None):
+    """Generate (or resume) one comic, write the requested exports and return its manifest record."""
+    started = time.time()
+    record = {"id": job["id"], "theme": job["theme"], "started_at": started}
+    try:
+        character_image = None
+        if job.get("reference_image"):
+            with open(job["reference_image"], "rb") as f:
+                character_image = ImageBuffer(f.read())
+
+        workspace = RunWorkspace(output_dir, run_id=str(job["id"]))
+        if fresh:
+            JobCheckpoint(workspace).clear()
+        result = await engine.generate(
+            int(job.get("pages", 4)),
+            job["theme"],
+            job.get("additional_content", "up to you"),
+            character_image,
+            job.get("language", "English"),
+            job.get("size", "1K"),
+            workspace=workspace,
+            progress=_JobProgress(job["id"]),
+            mode=job.get("mode", "chained"),
+            postprocess=postprocess,
+        )
+        export_names = []
+        for kind in exports:
+            options = export_options(kind, job["theme"], job.get("language", "English"))
+            export = await get_export_pool().export(result.pages, kind, export_format, **options)
+            await asyncio.to_thread(_write_file, workspace.path(export.name), export.data)
+            export_names.append(export.name)
+        record.update(
+            status="ok",
+            output_dir=workspace.directory,
+            comic_bytes=len(result.comic.data),
+            timings=result.timings,
+            exports=export_names,
+        )
+        if result.page_reports:
+            record["postprocess"] = [report.to_dict() for report in result.page_reports]
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["elapsed"] = time.time() - started
+    return record
+
+
+def _write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def run_jobs(
+    engine, jobs, output_dir, concurrency, manifest, fresh=False, exports=(), export_format="jpeg", postprocess=None
+):
+    """Run `jobs` with at most `concurrency` comics at once, writing a manifest line per finished comic."""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with slots:
+            return await run_job(engine, job, output_dir, fresh, exports, export_format, postprocess)
+
+    failures = 0
+    for finished in asyncio.as_completed([run(job) for job in jobs]):
+        record = await finished
+        manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+        manifest.flush()
+        if record["status"] != "ok":
+            failures += 1
+        print(f"[{record['id']}] {record['status']} in {record['elapsed']:.1f}s", flush=True)
+        for report in record.get("postprocess", []):
+            print(
+                f"[{record['id']}] page {report['page']}: {report['original_bytes'] / 1e6:.2f} MB -> "
+                f"{report['processed_bytes'] / 1e6:.2f} MB ({report['mode'] or 'unchanged'})",
+                flush=True,
+            )
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="Path to a .jsonl or .csv job file")
+    parser.add_argument("--output-dir", default=os.getenv("COMIC_OUTPUT_DIR", "output"))
+    parser.add_argument("--manifest", default=None, help="Manifest path (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Number of comics generated at once")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Global cap on concurrent model requests")
+    parser.add_argument(
+        "--page-concurrency", type=int, default=4, help="Pages of one comic generated at once in parallel mode"
+    )
+    parser.add_argument(
+        "--context-pages", type=int, default=2, help="Previous pages sent with each page in windowed mode"
+    )
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per model request before giving up")
+    parser.add_argument("--fresh", action="store_true", help="Discard checkpoints from earlier runs of the job file")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API")
+    parser.add_argument("--export", nargs="+", default=[], choices=list(EXPORTERS), help="Extra files to write per comic")
+    parser.add_argument(
+        "--export-format", default="jpeg", choices=list(IMAGE_FORMATS), help="Page encoding used by --export"
+    )
+    parser.add_argument(
+        "--postprocess", action="store_true", help="Trim, align and compact the pages before combining them"
+    )
+    parser.add_argument(
+        "--tone", default="auto", choices=TONES, help="Page tone with --postprocess (auto: grayscale if monochrome)"
+    )
+    parser.add_argument(
+        "--max-colors", type=int, default=256, help="Largest palette tried with --postprocess (0 for no palette)"
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default=None, help="Model backend (default: COMIC_BACKEND, else gemini)"
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    engine = ComicEngine(
+        create_client(args.backend),
+        cache=None if args.no_cache else GenerationCache.from_env(),
+        max_in_flight=args.max_in_flight,
+        page_concurrency=args.page_concurrency,
+        context_pages=args.context_pages,
+        retry_policy=RetryPolicy(max_attempts=args.max_attempts),
+        tracer=Tracer.from_env(),
+        scheduler=RequestScheduler.from_env(),
+    )
+    jobs = load_jobs(args.jobs)
+    postprocess = None
+    if args.postprocess:
+        postprocess = PostProcessOptions(tone=args.tone, quantize=args.max_colors > 0, max_colors=args.max_colors)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.jsonl")
+    jobs_dir = os.path.join(args.output_dir, os.path.splitext(os.path.basename(args.jobs))[0])
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        failures = asyncio.run(
+            run_jobs(
+                engine,
+                jobs,
+                jobs_dir,
+                args.concurrency,
+                manifest,
+                fresh=args.fresh,
+                exports=args.export,
+                export_format=args.export_format,
+                postprocess=postprocess,
+            )
+        )
+
+    print(f"{len(jobs) - failures}/{len(jobs)} comics generated. Manifest: {manifest_path}")
+    for model, counters in engine.retry_policy.stats().items():
+        print(f"{model}: {json.dumps(counters)}")
+    if engine.tracer.trace_path:
+        print(f"Stage timings: python -m src.metrics report {engine.tracer.trace_path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,20 +1,145 @@
-from PIL import Image
+import contextlib
+import os
+import struct
+import zlib
 
+from PIL import Image, ImageChops
 
-def combine_images_vertical(image_paths, output_path):
+from src.image_buffer import ImageBuffer
+
+# Number of scanlines encoded per step. Only one band of filtered rows and the
+# page it comes from are held in memory at any time.
+BAND_HEIGHT = 256
+
+# PNG filter type 2 ("Up"): each byte is stored as the difference to the byte
+# directly above it, which compresses manga pages almost as well as libpng's
+# adaptive filtering while being computable for a whole band at once.
+_PNG_FILTER_UP = b"\x02"
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "RGBA": 6}
+_IDAT_CHUNK_SIZE = 1 << 16
+
+
+class _PngStreamWriter:
+    """
+    Minimal PNG encoder that accepts the image as successive bands of rows,
+    so the full canvas never has to exist in memory.
+    """
+
+    def __init__(self, fp, width, height, mode, compress_level=6):
+        self.fp = fp
+        self.width = width
+        self.mode = mode
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self._previous_row = Image.new(mode, (width, 1))
+
+        fp.write(_PNG_SIGNATURE)
+        self._write_chunk(
+            b"IHDR",
+            struct.pack(">IIBBBBB", width, height, 8, _PNG_COLOR_TYPES[mode], 0, 0, 0),
+        )
+
+    def _write_chunk(self, chunk_type, data):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(chunk_type)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def _write_compressed(self, data):
+        self._pending += data
+        if len(self._pending) >= _IDAT_CHUNK_SIZE:
+            self._write_chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+
+    def write_band(self, band):
+        """Append a band of rows. The band must already be `width` pixels wide."""
+        # Build the "row above" for every row of the band, then filter the
+        # whole band in one C-level pass.
+        above = Image.new(self.mode, band.size)
+        above.paste(self._previous_row, (0, 0))
+        if band.height > 1:
+            above.paste(band.crop((0, 0, self.width, band.height - 1)), (0, 1))
+        filtered = ImageChops.subtract_modulo(band, above).tobytes()
+        self._previous_row = band.crop((0, band.height - 1, self.width, band.height))
+
+        stride = len(filtered) // band.height
+        rows = bytearray()
+        for offset in range(0, len(filtered), stride):
+            rows += _PNG_FILTER_UP
+            rows += filtered[offset : offset + stride]
+        self._write_compressed(self._compressor.compress(rows))
+
+    def close(self):
+        self._pending += self._compressor.flush()
+        if self._pending:
+            self._write_chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+        self._write_chunk(b"IEND", b"")
+
+
+def _has_alpha(img):
+    """Check from the header alone whether an image carries transparency."""
+    return img.mode in ("RGBA", "LA", "PA", "La", "RGBa") or "transparency" in img.info
+
+
+def is_grayscale(img):
+    """Check from the header alone whether an image has no colour (grayscale, 1-bit or a gray palette)."""
+    if img.mode in ("1", "L"):
+        return True
+    if img.mode == "P" and "transparency" not in img.info:
+        palette = img.getpalette() or []
+        return palette[0::3] == palette[1::3] == palette[2::3]
+    return False
+
+
+def _open_image(source):
+    """Open a page given as a path, file object, PIL image or ImageBuffer."""
+    if isinstance(source, Image.Image):
+        # Caller-owned image: use it without closing it afterwards
+        return contextlib.nullcontext(source)
+    if isinstance(source, ImageBuffer):
+        return source.open()
+    return Image.open(source)
+
+
+def _open_output(output):
+    if hasattr(output, "write"):
+        return contextlib.nullcontext(output)
+    return open(output, "wb")
+
+
+def combine_images_vertical(image_paths, output_path, band_height=BAND_HEIGHT):
     """
-    Combine multiple PNG images vertically and save them as a new file.
+    Combine multiple images vertically and save them as a new PNG.
 
-    :param image_paths: List of file paths to the images to be combined
-    :param output_path: Path where the combined image will be saved
+    The combined image is streamed to the output band by band: pages are decoded,
+    converted and released one at a time, so peak memory is bounded by the
+    largest single page rather than the whole strip. The output is RGBA if at
+    least one page has an alpha channel, grayscale if every page is grayscale
+    (e.g. post-processed manga pages) and RGB otherwise. Pages narrower than
+    the widest one are padded with white on the right.
+
+    :param image_paths: List of images to be combined: file paths, PIL images or ImageBuffers
+    :param output_path: Path or binary file object where the combined image will be saved
+    :param band_height: Number of rows encoded per step
+    :raises Exception: If a page cannot be decoded or the output cannot be written while
+                       streaming; a partially written output file is removed first
     """
     if not image_paths:
         print("Error: No image files specified for combining.")
         return
 
-    # 1. Open all images
+    # 1. Read only the image headers to lay out the canvas
     try:
-        images = [Image.open(path).convert("RGBA") for path in image_paths]
+        sizes = []
+        needs_alpha = False
+        all_gray = True
+        for path in image_paths:
+            with _open_image(path) as img:
+                sizes.append(img.size)
+                needs_alpha = needs_alpha or _has_alpha(img)
+                all_gray = all_gray and is_grayscale(img)
     except FileNotFoundError as e:
         print(f"Error: File not found - {e}")
         return
@@ -23,22 +148,35 @@ def combine_images_vertical(image_paths, output_path):
         return
 
     # 2. Calculate the width and height of the combined image
-    widths, heights = zip(*(img.size for img in images))
+    widths, heights = zip(*sizes)
     max_width = max(widths)
     total_height = sum(heights)
+    mode = "RGBA" if needs_alpha else "L" if all_gray else "RGB"
 
-    # 3. Create a new blank image
-    combined_img = Image.new("RGBA", (max_width, total_height))
-
-    # 4. Paste each image onto the new canvas
-    y_offset = 0
-    for img in images:
-        combined_img.paste(img, (0, y_offset))
-        y_offset += img.height
-
-    # 5. Save the combined image
-    try:
-        combined_img.save(output_path, "PNG")
+    # 3. Stream each page into the output, one band at a time
+    with _open_output(output_path) as fp:
+        try:
+            writer = _PngStreamWriter(fp, max_width, total_height, mode)
+            for path in image_paths:
+                with _open_image(path) as img:
+                    page = img.convert(mode)
+                for top in range(0, page.height, band_height):
+                    bottom = min(top + band_height, page.height)
+                    band = page.crop((0, top, page.width, bottom))
+                    if page.width < max_width:
+                        # Narrower pages are left-aligned on white paper
+                        padded = Image.new(mode, (max_width, bottom - top), "white")
+                        padded.paste(band, (0, 0))
+                        band = padded
+                    writer.write_band(band)
+                del page
+            writer.close()
+        except BaseException:
+            # Don't leave a truncated PNG behind that looks like a finished comic
+            if fp is not output_path:
+                fp.close()
+                with contextlib.suppress(OSError):
+                    os.remove(output_path)
+            raise
+    if isinstance(output_path, str):
         print(f"Images successfully combined and saved to '{output_path}'.")
-    except Exception as e:
-        print(f"An error occurred while saving the image: {e}")
@@ -0,0 +1,842 @@
+import asyncio
+import contextlib
+import io
+import time
+import uuid
+
+from src.checkpoint import JobCheckpoint
+from src.combine import combine_images_vertical
+from src.image_buffer import ImageBuffer
+from src.metrics import span
+from src.prompt import get_plot_writer_prompt
+from src.prompt_splitter import PageStreamSplitter, PlotFormatError, check_page_order, parse_pages, validate_pages
+from src.retry import EmptyResponseError, RetryError, RetryPolicy, check_blocked
+
+PLOT_MODEL = "gemini-3-pro-preview"
+IMAGE_MODEL = "gemini-3-pro-image-preview"
+
+# Page generation modes: "chained" sends each page with the previous one in a
+# chat; "windowed" draws pages in order too, but as stateless calls carrying only
+# the last few pages and a text summary of the rest; "parallel" anchors pages
+# 2..N to page 1 and generates them concurrently.
+GENERATION_MODES = ("chained", "windowed", "parallel")
+
+# Characters of each earlier page's description kept in the "windowed" summary
+SUMMARY_CHARS_PER_PAGE = 200
+
+CHARACTER_REFERENCE_INSTRUCTION = (
+    "Use this character design as a reference for the main character(s) in the manga."
+)
+ANCHOR_PAGE_INSTRUCTION = (
+    "This is page 1 of the same manga. Keep the characters, art style and tone consistent with it."
+)
+STORY_SO_FAR_INSTRUCTION = "The story so far, page by page:"
+PREVIOUS_PAGES_INSTRUCTION = (
+    "These are the previous pages of the same manga, in order. "
+    "Keep the characters, art style and tone consistent with them."
+)
+
+
+class ProgressCallback:
+    """
+    Receives progress events from the generation engine.
+
+    The default implementation ignores every event; front ends (Streamlit, CLI)
+    override the methods they care about. Callbacks run on the event loop
+    thread, and an exception raised from any of them cancels the job.
+    """
+
+    def start(self, num_pages):
+        """A job producing `num_pages` pages started."""
+
+    def status(self, message, percent):
+        """A new step started. `percent` is the overall progress (0-100)."""
+
+    def plot_ready(self, plot_text):
+        """The plot text is available."""
+
+    def page_ready(self, page_num, page_image):
+        """
+        Page `page_num` (1-based) is available as an ImageBuffer.
+
+        Called as soon as each page exists, before the combined comic is built
+        (after post-processing, if the job has any). In "parallel" mode pages
+        may arrive out of order.
+        """
+
+    def retry(self, page_num, attempt, max_retries, error):
+        """Generating page `page_num` failed and is being retried."""
+
+    def queued(self, status):
+        """
+        The job is waiting for its turn on a model, as a scheduler QueueStatus
+        (updated every heartbeat), or None once it is no longer waiting.
+        """
+
+    def error(self, message):
+        """Generation failed; a RuntimeError with `message` is raised next."""
+
+    def heartbeat(self):
+        """Called periodically while the job waits on the network. Raise to cancel it."""
+
+
+class ComicResult:
+    """
+    Output of a generation run: the plot, the pages, the combined comic and stage timings.
+
+    `page_specs` holds the parsed plot of each page (title, panels, dialogue) as PageSpecs.
+    If the pages were post-processed, `page_reports` holds a PageReport per page.
+    """
+
+    def __init__(self, plot_text, pages, comic, timings, page_specs=None, page_reports=None):
+        self.plot_text = plot_text
+        self.pages = pages
+        self.comic = comic
+        self.timings = timings
+        self.page_specs = page_specs or []
+        self.page_reports = page_reports or []
+
+
+class PlotStreamError(RuntimeError):
+    """The plot stream broke after some pages were already handed to image generation."""
+
+
+class PagePrompts:
+    """
+    Page prompts of a job, which may still be arriving from a streamed plot.
+
+    Consumers await `get(page_num)`; the plot producer publishes pages with
+    `set` and calls `fail` if the plot cannot be produced.
+    """
+
+    def __init__(self, num_pages):
+        loop = asyncio.get_running_loop()
+        self.num_pages = num_pages
+        self._futures = {page_num: loop.create_future() for page_num in range(1, num_pages + 1)}
+        self.pages = {}
+        self.published = 0
+
+    def set(self, page):
+        """Publish a PageSpec. Pages beyond `num_pages` and repeated pages are ignored."""
+        future = self._futures.get(page.number)
+        if future is not None and not future.done():
+            self.pages[page.number] = page
+            future.set_result(page.text)
+            self.published += 1
+
+    def fail(self, error):
+        """The plot could not be produced: every pending page fails with `error`."""
+        for future in self._futures.values():
+            if future.done():
+                continue
+            if isinstance(error, Exception):
+                future.set_exception(error)
+                # Consumers may never ask for this page; don't warn about an unretrieved exception
+                future.exception()
+            else:
+                future.cancel()
+
+    async def get(self, page_num):
+        return await asyncio.shield(self._futures[page_num])
+
+
+class ComicEngine:
+    """
+    Asynchronous comic generator built on the google-genai `client.aio` surface.
+
+    One engine can drive many comic jobs concurrently on a single event loop.
+    Model calls are bounded per model, by the RequestScheduler if the engine
+    has one and by a semaphore per model otherwise, and optionally by a global
+    cap on requests in flight. An engine (and its semaphores) must only be
+    used from one event loop.
+    """
+
+    def __init__(
+        self,
+        client,
+        cache=None,
+        model_concurrency=None,
+        max_in_flight=None,
+        page_concurrency=4,
+        retry_policy=None,
+        heartbeat_interval=1.0,
+        tracer=None,
+        scheduler=None,
+        context_pages=2,
+    ):
+        """
+        :param client: google.genai Client
+        :param cache: Optional GenerationCache consulted before every model call
+        :param model_concurrency: Dict of model name -> maximum concurrent calls (default 4 per model);
+            ignored with a `scheduler`, whose per-model limits apply instead
+        :param max_in_flight: Optional cap on concurrent calls across all models
+        :param page_concurrency: Maximum pages of one comic generated at once in "parallel" mode
+        :param retry_policy: RetryPolicy applied to every model call (a default one if omitted)
+        :param heartbeat_interval: Seconds between ProgressCallback.heartbeat calls
+        :param tracer: Optional Tracer recording every run's stages
+        :param scheduler: Optional RequestScheduler every model call waits its turn in; share one to coordinate engines
+        :param context_pages: Previous pages sent as images with each page in "windowed" mode
+        """
+        self.client = client
+        self.cache = cache
+        self.model_concurrency = model_concurrency or {}
+        self.page_concurrency = page_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.heartbeat_interval = heartbeat_interval
+        self.tracer = tracer
+        self.scheduler = scheduler
+        self.context_pages = context_pages
+        self._model_semaphores = {}
+        self._in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+
+    def _semaphore(self, model):
+        if model not in self._model_semaphores:
+            self._model_semaphores[model] = asyncio.Semaphore(self.model_concurrency.get(model, 4))
+        return self._model_semaphores[model]
+
+    async def call_model(self, model, request):
+        """Await `request()` (a coroutine factory) while holding the model's slots."""
+        async with contextlib.AsyncExitStack() as stack:
+            if self._in_flight is not None:
+                await stack.enter_async_context(self._in_flight)
+            if self.scheduler is not None:
+                # The scheduler caps requests in flight per model itself, and reports queue positions
+                await stack.enter_async_context(self.scheduler.slot(model))
+            else:
+                await stack.enter_async_context(self._semaphore(model))
+            return await request()
+
+    async def generate(
+        self,
+        num_pages,
+        theme,
+        additional_content="up to you",
+        character_image=None,
+        language="English",
+        image_size="1K",
+        workspace=None,
+        progress=None,
+        mode="chained",
+        postprocess=None,
+    ):
+        """
+        Generate a manga comic: plot → page prompts → page images → combined strip.
+
+        The job runs as its own task. Cancelling the awaiting task, or raising
+        from `progress.heartbeat()`, cancels any in-flight model request.
+
+        Args:
+            num_pages: Number of pages (1–7)
+            theme: Manga theme
+            additional_content: Additional story elements, or "up to you"
+            character_image: Optional ImageBuffer with a character design reference
+            language: "English" or "Japanese"
+            image_size: "1K", "2K" or "4K"
+            workspace: Optional RunWorkspace to persist the results into
+            progress: Optional ProgressCallback receiving progress events
+            mode: "chained" (each page references the previous one in a chat),
+                  "windowed" (each page references the last `context_pages` pages) or
+                  "parallel" (pages 2..N are generated concurrently from page 1)
+            postprocess: Optional PostProcessOptions applied to every page before
+                  the pages are combined. The model and the checkpoint keep the pages
+                  as generated; the result, the progress callback and the combined
+                  comic get the processed ones.
+
+        Returns:
+            ComicResult
+        """
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode: {mode}")
+        progress = progress or ProgressCallback()
+        job_id = uuid.uuid4().hex
+        job = asyncio.ensure_future(
+            self._run_job(
+                job_id,
+                self._generate(
+                    num_pages,
+                    theme,
+                    additional_content,
+                    character_image,
+                    language,
+                    image_size,
+                    workspace,
+                    progress,
+                    mode,
+                    postprocess,
+                ),
+                workspace=workspace.run_id if workspace else None,
+                num_pages=num_pages,
+                mode=mode,
+                image_size=image_size,
+                language=language,
+            )
+        )
+        queued = False
+        try:
+            while not job.done():
+                await asyncio.wait({job}, timeout=self.heartbeat_interval)
+                if not job.done():
+                    if self.scheduler is not None:
+                        status = self.scheduler.status(job_id)
+                        if status is not None or queued:
+                            progress.queued(status)
+                        queued = status is not None
+                    progress.heartbeat()
+            return job.result()
+        finally:
+            if not job.done():
+                job.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await job
+
+    async def resume(self, workspace, progress=None, postprocess=None):
+        """
+        Resume a job from the checkpoint in `workspace`.
+
+        The saved plot and completed pages are reused; generation continues from
+        the first missing page, with the previous page as the reference image.
+
+        :param workspace: RunWorkspace of a previous (failed or interrupted) run
+        :param progress: Optional ProgressCallback receiving progress events
+        :param postprocess: Optional PostProcessOptions; the checkpoint keeps unprocessed pages, so any can be used
+        :return: ComicResult
+        """
+        checkpoint = JobCheckpoint(workspace)
+        params = await asyncio.to_thread(checkpoint.load_params)
+        if params is None:
+            raise ValueError(f"No checkpoint found in {workspace.directory}")
+        character_image = await asyncio.to_thread(checkpoint.load_character_image)
+        return await self.generate(
+            params["num_pages"],
+            params["theme"],
+            params["additional_content"],
+            character_image,
+            params["language"],
+            params["image_size"],
+            workspace=workspace,
+            progress=progress,
+            mode=params["mode"],
+            postprocess=postprocess,
+        )
+
+    async def _run_job(self, job_id, job, **attrs):
+        """Await `job` as job `job_id` of the scheduler and as a traced run, if the engine has them."""
+        with contextlib.ExitStack() as stack:
+            if self.scheduler is not None:
+                stack.enter_context(self.scheduler.job(job_id))
+            if self.tracer is not None:
+                stack.enter_context(self.tracer.run(**attrs))
+            return await job
+
+    async def _generate(
+        self,
+        num_pages,
+        theme,
+        additional_content,
+        character_image,
+        language,
+        image_size,
+        workspace,
+        progress,
+        mode,
+        postprocess,
+    ):
+        timings = {}
+        started = time.perf_counter()
+        progress.start(num_pages)
+
+        # Pick up where a previous run with the same parameters stopped
+        checkpoint = None
+        if workspace is not None:
+            checkpoint = JobCheckpoint(workspace)
+            params = JobCheckpoint.job_params(
+                num_pages, theme, additional_content, character_image, language, image_size, mode
+            )
+            with span("load"):
+                await asyncio.to_thread(checkpoint.start, params, character_image)
+        plot_text = await asyncio.to_thread(checkpoint.load_plot) if checkpoint else None
+
+        prompts = PagePrompts(num_pages)
+        plot_task = None
+        completed = {}
+        if plot_text is None:
+            if checkpoint:
+                # Pages left by a run whose plot stream failed don't belong to the new plot
+                with span("load"):
+                    await asyncio.to_thread(checkpoint.clear_pages)
+
+            # Step 1: Stream the plot; page images start as soon as their block is complete
+            progress.status("Step 1: Generating plot...", 10)
+
+            with span("prompt"):
+                plot_writer_prompt = get_plot_writer_prompt(theme, additional_content, num_pages, language)
+            plot_task = asyncio.ensure_future(
+                self._generate_plot(plot_writer_prompt, prompts, progress, checkpoint, timings)
+            )
+        else:
+            progress.status("Steps 1-2: Resuming from the saved plot...", 20)
+            timings["plot"] = 0.0
+            # Validated up front, so a broken plot fails before any image call
+            with span("split"):
+                for page in validate_pages(parse_pages(plot_text), num_pages).values():
+                    prompts.set(page)
+            progress.plot_ready(plot_text)
+            # Saved pages only belong to this job if its plot was saved too
+            with span("load") as load_span:
+                completed = await asyncio.to_thread(checkpoint.load_pages)
+                load_span.set(pages=len(completed))
+
+        # Imported here so importing the engine stays cheap (see src.worker)
+        from google.genai import types
+
+        image_config = types.ImageConfig(aspect_ratio="3:4", image_size=image_size)
+        generate_config = types.GenerateContentConfig(
+            response_modalities=["IMAGE"],
+            image_config=image_config,
+        )
+
+        # Pages are post-processed in worker threads while the next ones are generated
+        postprocessor = None
+        if postprocess is not None:
+            from src.postprocess import PagePostProcessor  # NumPy, only needed here
+
+            postprocessor = PagePostProcessor(postprocess)
+
+        # Generate each page
+        try:
+            if mode == "parallel":
+                page_images, timings["pages"] = await self._generate_pages_parallel(
+                    num_pages, prompts, character_image, generate_config, progress, completed, checkpoint, postprocessor
+                )
+            else:
+                page_images, timings["pages"] = await self._generate_pages_chained(
+                    num_pages,
+                    prompts,
+                    character_image,
+                    generate_config,
+                    progress,
+                    completed,
+                    checkpoint,
+                    postprocessor,
+                    window=self.context_pages if mode == "windowed" else None,
+                )
+            if plot_task is not None:
+                plot_text = await plot_task
+
+            page_reports = None
+            if postprocessor is not None:
+                progress.status("Post-processing pages...", 85)
+                stage_start = time.perf_counter()
+                with span("postprocess") as postprocess_span:
+                    page_images, page_reports = await postprocessor.results()
+                    postprocess_span.set(
+                        bytes_in=sum(report.original_bytes for report in page_reports),
+                        bytes_out=sum(report.processed_bytes for report in page_reports),
+                    )
+                # Only the part not hidden behind page generation
+                timings["postprocess"] = time.perf_counter() - stage_start
+        finally:
+            if postprocessor is not None:
+                postprocessor.cancel()
+            if plot_task is not None:
+                if not plot_task.done():
+                    plot_task.cancel()
+                elif not plot_task.cancelled():
+                    # Its error already reached the pages waiting for a prompt
+                    plot_task.exception()
+
+        # Verify we have all pages
+        if len(page_images) != num_pages:
+            raise RuntimeError(
+                f"Expected {num_pages} pages but only generated {len(page_images)}"
+            )
+
+        # Combine all pages vertically, off the event loop
+        progress.status("Final step: Combining all pages...", 90)
+
+        stage_start = time.perf_counter()
+        with span("combine") as combine_span:
+            comic = await asyncio.to_thread(_combine, page_images)
+            combine_span.set(bytes=len(comic.data))
+        timings["combine"] = time.perf_counter() - stage_start
+
+        if checkpoint:
+            with span("save", item="comic", bytes=len(comic.data)):
+                await asyncio.to_thread(checkpoint.save_comic, comic, num_pages)
+
+        timings["total"] = time.perf_counter() - started
+        progress.status("✅ Comic generation complete!", 100)
+
+        page_specs = [prompts.pages[page_num] for page_num in range(1, num_pages + 1)]
+        return ComicResult(plot_text, page_images, comic, timings, page_specs, page_reports)
+
+    async def _generate_plot(self, plot_writer_prompt, prompts, progress, checkpoint, timings):
+        """
+        Stream the plot and publish each page prompt to `prompts` as soon as its
+        block is complete. The full plot is served from the cache when possible.
+
+        :return: The complete plot text
+        """
+        cache = self.cache
+        aio = self.client.aio
+        stage_start = time.perf_counter()
+
+        plot_key = cache.make_key(PLOT_MODEL, plot_writer_prompt) if cache else None
+        plot_text = cache.get_text(plot_key) if cache else None
+
+        async def request_plot():
+            with span("plot_call", model=PLOT_MODEL) as call_span:
+                return await stream_plot(call_span)
+
+        async def stream_plot(call_span):
+            splitter = PageStreamSplitter()
+            checked_headings = 0
+            chunks = []
+
+            async def read_stream():
+                nonlocal checked_headings
+                stream = await aio.models.generate_content_stream(model=PLOT_MODEL, contents=plot_writer_prompt)
+                async for chunk in stream:
+                    check_blocked(chunk)
+                    # Token counts arrive with the last chunk
+                    call_span.record_usage(chunk.usage_metadata)
+                    chunks.append(chunk.text or "")
+                    pages = splitter.feed(chunks[-1])
+                    # Reject a skipped or repeated page before publishing the page before it
+                    if len(splitter.headings) != checked_headings:
+                        check_page_order(splitter.headings, prompts.num_pages)
+                        checked_headings = len(splitter.headings)
+                    for page in pages:
+                        if "plot_first_page" not in timings:
+                            timings["plot_first_page"] = time.perf_counter() - stage_start
+                            call_span.set(first_page_seconds=timings["plot_first_page"])
+                        prompts.set(page)
+
+            try:
+                # The request only runs while the stream is read, so the model's slots
+                # (and a rate limit error raised mid-stream) cover the whole stream
+                await self.call_model(PLOT_MODEL, read_stream)
+            except PlotFormatError:
+                raise
+            except Exception as e:
+                if prompts.published:
+                    # Pages are already being drawn from this stream; a retry would
+                    # produce a different plot, so give up instead.
+                    raise PlotStreamError(f"Plot stream failed after {prompts.published} page(s): {e}") from e
+                raise
+            pages = splitter.close()
+            check_page_order(splitter.headings, prompts.num_pages)
+            for page in pages:
+                prompts.set(page)
+            plot_text = "".join(chunks)
+            if not plot_text:
+                raise EmptyResponseError("Plot response contained no text")
+            call_span.set(chars=len(plot_text))
+            return plot_text
+
+        def on_plot_retry(attempt, max_attempts, error, delay):
+            progress.status(
+                f"⚠️ Plot request failed ({error}), retrying in {delay:.0f}s ({attempt}/{max_attempts})...", 10
+            )
+
+        try:
+            cached = plot_text is not None
+            with span("plot", cached=cached):
+                if not cached:
+                    try:
+                        plot_text = await self.retry_policy.run(PLOT_MODEL, request_plot, on_plot_retry)
+                    except RetryError as e:
+                        error_msg = f"Failed to generate the plot after {e.attempts} attempt(s): {str(e)}"
+                        progress.error(error_msg)
+                        raise RuntimeError(error_msg) from e.cause
+            timings["plot"] = time.perf_counter() - stage_start
+
+            # Step 2: Split into page prompts. Streamed pages were checked as they
+            # arrived; this catches trailing missing pages and cached plots.
+            with span("split"):
+                page_specs = validate_pages(parse_pages(plot_text), prompts.num_pages)
+                for page in page_specs.values():
+                    prompts.set(page)
+
+            # Only a plot that passed validation is cached; a malformed one must be regenerated next time
+            if cache and not cached:
+                await asyncio.to_thread(cache.put, plot_key, plot_text)
+        except BaseException as e:
+            prompts.fail(e)
+            raise
+
+        progress.plot_ready(plot_text)
+        if checkpoint:
+            with span("save", item="plot"):
+                await asyncio.to_thread(checkpoint.save_plot, plot_text, list(page_specs.values()))
+        return plot_text
+
+    async def _page_done(self, page_num, page_image, progress, checkpoint, postprocessor=None, saved=False):
+        """
+        Checkpoint a finished page (unless it came from the checkpoint) and report
+        it, once post-processed if the job has a PagePostProcessor.
+        """
+        if checkpoint and not saved:
+            with span("save", item="page", page=page_num, bytes=len(page_image.data)):
+                await asyncio.to_thread(checkpoint.save_page, page_num, page_image)
+        if postprocessor is not None:
+            postprocessor.submit(page_num, page_image, lambda processed: progress.page_ready(page_num, processed))
+        else:
+            progress.page_ready(page_num, page_image)
+
+    async def _generate_pages_chained(
+        self,
+        num_pages,
+        prompts,
+        character_image,
+        generate_config,
+        progress,
+        completed,
+        checkpoint,
+        postprocessor=None,
+        window=None,
+    ):
+        """
+        Generate pages one after another in a chat, each referencing the previous page.
+
+        A chat resends its whole history, every earlier prompt and page image,
+        with each message. With `window` set ("windowed" mode) no chat is kept:
+        each page is a stateless call carrying the character reference, the
+        last `window` pages and a short summary of the pages before them, so
+        the request size stays bounded however many pages there are.
+
+        Pages in `completed` (page number -> ImageBuffer) are reused; the first
+        missing page is then seeded with the last completed page as its reference.
+        """
+        if window is None:
+            chat = self.client.aio.chats.create(model=IMAGE_MODEL, config=generate_config)
+
+            def send(contents):
+                return chat.send_message(contents)
+
+        else:
+            aio = self.client.aio
+
+            def send(contents):
+                return aio.models.generate_content(model=IMAGE_MODEL, contents=contents, config=generate_config)
+
+        page_images = []
+        page_timings = []
+        # Bytes of the chat history resent with every message
+        history_bytes = 0
+
+        for page_num in range(1, num_pages + 1):
+            progress.status(
+                f"Step {page_num + 2}: Generating page {page_num}/{num_pages}...",
+                int(20 + (page_num / num_pages) * 60),
+            )
+            stage_start = time.perf_counter()
+
+            if page_num in completed:
+                page_images.append(completed[page_num])
+                page_timings.append(0.0)
+                await self._page_done(page_num, page_images[-1], progress, checkpoint, postprocessor, saved=True)
+                continue
+
+            page_prompt = await prompts.get(page_num)
+
+            if window is not None:
+                message = _windowed_message(page_num, page_prompt, page_images, prompts.pages, character_image, window)
+            # For page 1, include the character reference image if provided
+            elif page_num == 1:
+                if character_image is not None:
+                    message = [CHARACTER_REFERENCE_INSTRUCTION, character_image, page_prompt]
+                else:
+                    message = [page_prompt]
+            else:
+                # For subsequent pages, send prompt + previous page image(s)
+                message = [page_prompt]
+
+                if page_images:
+                    # Reference only the most recent page
+                    message.append(page_images[-1])
+
+            page_images.append(
+                await self._generate_page(page_num, message, generate_config, send, progress, history_bytes)
+            )
+            page_timings.append(time.perf_counter() - stage_start)
+            if window is None:
+                history_bytes += _request_bytes(message) + len(page_images[-1].data)
+            await self._page_done(page_num, page_images[-1], progress, checkpoint, postprocessor)
+
+        return page_images, page_timings
+
+    async def _generate_pages_parallel(
+        self, num_pages, prompts, character_image, generate_config, progress, completed, checkpoint, postprocessor=None
+    ):
+        """
+        Generate page 1 first, then pages 2..N concurrently.
+
+        Instead of chaining through the previous page, every later page is
+        anchored to page 1 (and the character reference, if any), so the whole
+        comic takes about two image-call latencies. Pages in `completed` are reused.
+        """
+        aio = self.client.aio
+        page_images = [None] * num_pages
+        page_timings = [None] * num_pages
+        done = 0
+
+        def send(contents):
+            return aio.models.generate_content(model=IMAGE_MODEL, contents=contents, config=generate_config)
+
+        async def generate(page_num, message):
+            nonlocal done
+            stage_start = time.perf_counter()
+            saved = page_num in completed
+            if saved:
+                page_image = completed[page_num]
+            else:
+                page_image = await self._generate_page(page_num, message, generate_config, send, progress)
+            page_images[page_num - 1] = page_image
+            page_timings[page_num - 1] = 0.0 if saved else time.perf_counter() - stage_start
+            done += 1
+            progress.status(
+                f"Step 3: Generated {done}/{num_pages} pages...",
+                int(20 + (done / num_pages) * 60),
+            )
+            await self._page_done(page_num, page_image, progress, checkpoint, postprocessor, saved)
+
+        # The anchor page everything else is drawn against
+        progress.status(f"Step 3: Generating page 1/{num_pages}...", 20)
+        first_prompt = await prompts.get(1)
+        first_message = [first_prompt]
+        if character_image is not None:
+            first_message = [CHARACTER_REFERENCE_INSTRUCTION, character_image, first_prompt]
+        await generate(1, first_message)
+
+        slots = asyncio.Semaphore(self.page_concurrency)
+
+        async def generate_anchored(page_num):
+            message = [ANCHOR_PAGE_INSTRUCTION, page_images[0]]
+            if character_image is not None:
+                message += [CHARACTER_REFERENCE_INSTRUCTION, character_image]
+            message.append(await prompts.get(page_num))
+            async with slots:
+                await generate(page_num, message)
+
+        tasks = [asyncio.ensure_future(generate_anchored(page_num)) for page_num in range(2, num_pages + 1)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # If one page failed, don't keep paying for the others
+            for task in tasks:
+                task.cancel()
+
+        return page_images, page_timings
+
+    async def _generate_page(self, page_num, message, generate_config, send, progress, history_bytes=0):
+        """
+        Generate a single page, retrying according to the engine's RetryPolicy.
+
+        :param message: Request contents; ImageBuffers are sent as inline parts
+        :param send: Callable taking the contents and returning the response coroutine
+        :param history_bytes: Size of the chat history `send` adds to the request, for the trace
+        :return: The page as an ImageBuffer
+        """
+        with span("page", page=page_num) as page_span:
+            return await self._request_page(
+                page_num, message, generate_config, send, progress, page_span, history_bytes
+            )
+
+    async def _request_page(self, page_num, message, generate_config, send, progress, page_span, history_bytes):
+        cache = self.cache
+
+        # Identical request seen before: serve the stored page and skip the API call
+        page_cache_key = cache.make_key(IMAGE_MODEL, message, generate_config.image_config) if cache else None
+        cached_page = cache.get(page_cache_key) if cache else None
+        page_span.set(cached=cached_page is not None)
+        if cached_page is not None:
+            return ImageBuffer(cached_page)
+
+        contents = [part.as_part() if isinstance(part, ImageBuffer) else part for part in message]
+        request_bytes = history_bytes + _request_bytes(message)
+        attempts = 0
+
+        async def request_page():
+            nonlocal attempts
+            attempts += 1
+            with span("page_call", model=IMAGE_MODEL, page=page_num, request_bytes=request_bytes) as call_span:
+                response = await self.call_model(IMAGE_MODEL, lambda: send(contents))
+
+                # Check if response and response.parts are valid
+                if response is None:
+                    raise EmptyResponseError("Received None response from API")
+                call_span.record_usage(response.usage_metadata)
+                check_blocked(response)
+                if not response.parts:
+                    raise EmptyResponseError("Response has no valid parts attribute")
+
+                # Keep the generated image as returned by the API
+                for part in response.parts:
+                    if part.inline_data is not None:
+                        page_image = ImageBuffer.from_part(part)
+                        call_span.set(image_bytes=len(page_image.data))
+                        return page_image
+
+                raise EmptyResponseError("No image data found in response")
+
+        def on_retry(attempt, max_attempts, error, delay):
+            progress.retry(page_num, attempt, max_attempts, error)
+
+        try:
+            page_image = await self.retry_policy.run(IMAGE_MODEL, request_page, on_retry)
+        except RetryError as e:
+            error_msg = f"Failed to generate page {page_num} after {e.attempts} attempt(s): {str(e)}"
+            progress.error(error_msg)
+            raise RuntimeError(error_msg) from e.cause
+        finally:
+            page_span.set(attempts=attempts)
+
+        if cache:
+            await asyncio.to_thread(cache.put, page_cache_key, page_image.data)
+        return page_image
+
+
+def _windowed_message(page_num, page_prompt, page_images, page_specs, character_image, window):
+    """
+    Contents of a stateless "windowed" request for `page_num`: the character
+    reference, a summary of the pages before the window, the last `window`
+    pages and the page prompt.
+    """
+    message = []
+    if character_image is not None:
+        message += [CHARACTER_REFERENCE_INSTRUCTION, character_image]
+    recent = page_images[-window:] if window > 0 else []
+    summarized = range(1, page_num - len(recent))
+    if summarized:
+        lines = [_summarize_page(page_specs[number]) for number in summarized if number in page_specs]
+        message.append("\n".join([STORY_SO_FAR_INSTRUCTION, *lines]))
+    if recent:
+        message += [PREVIOUS_PAGES_INSTRUCTION, *recent]
+    message.append(page_prompt)
+    return message
+
+
+def _summarize_page(page):
+    """One line describing a PageSpec: its panels, or its text without the heading."""
+    if page.panels:
+        description = " / ".join(page.panels)
+    else:
+        description = " ".join(page.text.split()[len(page.heading.split()) :])
+    description = " ".join(description.split())
+    if len(description) > SUMMARY_CHARS_PER_PAGE:
+        description = description[: SUMMARY_CHARS_PER_PAGE - 1] + "…"
+    return f"Page {page.number}: {description}"
+
+
+def _request_bytes(message):
+    """Bytes of text and images in request contents."""
+    return sum(len(part.data) if isinstance(part, ImageBuffer) else len(part.encode("utf-8")) for part in message)
+
+
+def _combine(page_images):
+    combined = io.BytesIO()
+    combine_images_vertical(page_images, combined)
+    if not combined.getbuffer().nbytes:
+        raise RuntimeError("Failed to combine the generated pages")
+    return ImageBuffer(combined.getvalue())
@@ -0,0 +1,397 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from PIL import Image, features
+
+from src.combine import combine_images_vertical, is_grayscale
+from src.image_buffer import ImageBuffer
+
+
+class ImageFormat:
+    """An encoding pages can be exported in, with save options tuned for manga pages."""
+
+    def __init__(self, name, pil_format, mime_type, extension, max_dimension, alpha, feature=None, **save_options):
+        """
+        :param name: Short name used in the UI and on the command line
+        :param pil_format: Pillow format name
+        :param mime_type: MIME type of the encoded file
+        :param extension: File extension, including the dot
+        :param max_dimension: Largest width or height the encoder accepts
+        :param alpha: Whether the format can store an alpha channel
+        :param feature: Pillow feature that must be compiled in (see PIL.features.check)
+        :param save_options: Default options passed to Image.save; `quality` can be overridden per export
+        """
+        self.name = name
+        self.pil_format = pil_format
+        self.mime_type = mime_type
+        self.extension = extension
+        self.max_dimension = max_dimension
+        self.alpha = alpha
+        self.feature = feature
+        self.save_options = save_options
+
+    @property
+    def available(self):
+        return self.feature is None or features.check(self.feature)
+
+    def encode(self, img, quality=None):
+        """Encode a PIL image and return the bytes."""
+        if not self.available:
+            raise ValueError(f"{self.name.upper()} encoding is not supported by this Pillow build")
+        if max(img.size) > self.max_dimension:
+            raise ValueError(
+                f"{img.width}x{img.height} is too large for {self.name.upper()} "
+                f"(max {self.max_dimension}px per side); use the grid layout or a smaller max_width"
+            )
+        if img.mode not in ("RGB", "L") and not (self.alpha and img.mode in ("RGBA", "LA")):
+            if is_grayscale(img):
+                # 1-bit and gray palette pages (see src.postprocess) stay single-channel
+                img = img.convert("L")
+            else:
+                img = img.convert("RGBA" if self.alpha and "A" in img.getbands() else "RGB")
+        options = dict(self.save_options)
+        if quality is not None and "quality" in options:
+            options["quality"] = quality
+        buffer = io.BytesIO()
+        img.save(buffer, self.pil_format, **options)
+        return buffer.getvalue()
+
+
+IMAGE_FORMATS = {
+    "png": ImageFormat("png", "PNG", "image/png", ".png", 2**31 - 1, alpha=True, compress_level=6),
+    "jpeg": ImageFormat(
+        "jpeg", "JPEG", "image/jpeg", ".jpg", 65535, alpha=False, quality=85, optimize=True, progressive=True
+    ),
+    "webp": ImageFormat("webp", "WEBP", "image/webp", ".webp", 16383, alpha=True, feature="webp", quality=80, method=4),
+    "avif": ImageFormat("avif", "AVIF", "image/avif", ".avif", 16384, alpha=True, feature="avif", quality=60, speed=8),
+}
+
+
+class ExportFile:
+    """One exported file, ready to be saved or offered as a download."""
+
+    def __init__(self, name, data, mime_type):
+        self.name = name
+        self.data = data
+        self.mime_type = mime_type
+
+
+class _Exporter:
+    def __init__(self, function, filename, mime_type):
+        self.function = function
+        self.filename = filename
+        self.mime_type = mime_type
+
+
+EXPORTERS = {}
+
+
+def register_exporter(name, filename, mime_type=None):
+    """
+    Register `function(pages, image_format, quality, **options) -> bytes` as export `name`.
+
+    :param filename: Output file name template; `{pages}` is the page count and
+                     `{ext}` the extension of the chosen image format
+    :param mime_type: MIME type of the output, or None to use the image format's
+    """
+
+    def decorator(function):
+        EXPORTERS[name] = _Exporter(function, filename, mime_type)
+        return function
+
+    return decorator
+
+
+def _open_page(data, max_width=None):
+    """Decode a page, downscaled to `max_width` if it is wider."""
+    img = Image.open(io.BytesIO(data))
+    if max_width and img.width > max_width:
+        img.draft("RGB", (max_width, max_width * img.height // img.width))
+        img.thumbnail((max_width, img.height))
+    return img
+
+
+def _encode_page(data, image_format, quality=None, max_width=None):
+    """Encode one page, passing the source bytes through when they already match."""
+    source = ImageBuffer(data)
+    if source.mime_type == image_format.mime_type and quality is None:
+        with source.open() as img:
+            if not max_width or img.width <= max_width:
+                return data
+    with _open_page(data, max_width) as img:
+        return image_format.encode(img, quality)
+
+
+@register_exporter("pages", "{pages}_page_comic_pages.zip", "application/zip")
+def export_pages(pages, image_format, quality=None, max_width=None):
+    """A ZIP archive with one file per page."""
+    output = io.BytesIO()
+    # Pages are already compressed; storing them avoids a second, useless deflate
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for page_num, data in enumerate(pages, start=1):
+            archive.writestr(
+                f"page{page_num:03d}{image_format.extension}", _encode_page(data, image_format, quality, max_width)
+            )
+    return output.getvalue()
+
+
+@register_exporter("cbz", "{pages}_page_comic.cbz", "application/vnd.comicbook+zip")
+def export_cbz(pages, image_format, quality=None, max_width=None, title="Manga", language="English"):
+    """A CBZ comic archive: the pages in reading order plus a ComicInfo.xml for comic readers."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for page_num, data in enumerate(pages, start=1):
+            archive.writestr(
+                f"{page_num:03d}{image_format.extension}", _encode_page(data, image_format, quality, max_width)
+            )
+        comic_info = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            "<ComicInfo>\n"
+            f"  <Title>{escape(title)}</Title>\n"
+            f"  <PageCount>{len(pages)}</PageCount>\n"
+            f"  <LanguageISO>{'ja' if language == 'Japanese' else 'en'}</LanguageISO>\n"
+            f"  <Manga>{'YesAndRightToLeft' if language == 'Japanese' else 'Yes'}</Manga>\n"
+            "</ComicInfo>\n"
+        )
+        archive.writestr("ComicInfo.xml", comic_info.encode("utf-8"))
+    return output.getvalue()
+
+
+@register_exporter("pdf", "{pages}_page_comic.pdf", "application/pdf")
+def export_pdf(pages, image_format, quality=None, max_width=None, dpi=300):
+    """
+    A PDF with one page per comic page.
+
+    Pages are always embedded as JPEG (the only lossy image filter PDF viewers
+    support everywhere), so `image_format` is ignored. The file is written one
+    page at a time and only one decoded page is held in memory.
+    """
+    jpeg = IMAGE_FORMATS["jpeg"]
+    output = io.BytesIO()
+    writer = _PdfWriter(output, len(pages))
+    for data in pages:
+        with Image.open(io.BytesIO(data)) as img:
+            size, mode = img.size, img.mode
+            # A JPEG page that needs no resizing is embedded without re-encoding
+            passthrough = (
+                img.format == "JPEG" and mode in ("RGB", "L") and quality is None and not (max_width and img.width > max_width)
+            )
+        if passthrough:
+            encoded = data
+        else:
+            with _open_page(data, max_width) as img:
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                size, mode = img.size, img.mode
+                encoded = jpeg.encode(img, quality)
+        writer.add_page(encoded, size, mode == "L", dpi)
+    writer.close()
+    return output.getvalue()
+
+
+@register_exporter("strip", "{pages}_page_comic{ext}")
+def export_strip(pages, image_format, quality=None, max_width=None):
+    """All pages stacked vertically in a single image, like the combined comic."""
+    if image_format.name == "png" and not max_width:
+        # Streamed band by band; the full strip is never held in memory
+        output = io.BytesIO()
+        combine_images_vertical([ImageBuffer(data) for data in pages], output)
+        if not output.getbuffer().nbytes:
+            raise RuntimeError("Failed to combine the pages")
+        return output.getvalue()
+
+    return _grid(pages, image_format, quality, max_width, columns=1, gutter=0, background="white", rtl=False)
+
+
+@register_exporter("grid", "{pages}_page_comic_grid{ext}")
+def export_grid(pages, image_format, quality=None, max_width=None, columns=2, gutter=24, background="white", rtl=False):
+    """
+    Pages tiled in a grid, `columns` pages per row.
+
+    With `rtl` the rows are filled right to left, in Japanese reading order.
+    """
+    return _grid(pages, image_format, quality, max_width, columns, gutter, background, rtl)
+
+
+def _grid(pages, image_format, quality, max_width, columns, gutter, background, rtl):
+    sizes = []
+    for data in pages:
+        with _open_page(data, max_width) as img:
+            sizes.append(img.size)
+    cell_width = max(width for width, _ in sizes)
+    cell_height = max(height for _, height in sizes)
+    columns = max(1, min(columns, len(pages)))
+    rows = -(-len(pages) // columns)
+    canvas = Image.new(
+        "RGB",
+        (columns * cell_width + (columns - 1) * gutter, rows * cell_height + (rows - 1) * gutter),
+        background,
+    )
+    if max(canvas.size) > image_format.max_dimension:
+        raise ValueError(
+            f"{canvas.width}x{canvas.height} is too large for {image_format.name.upper()} "
+            f"(max {image_format.max_dimension}px per side); use another layout or a smaller max_width"
+        )
+    for index, data in enumerate(pages):
+        row, column = divmod(index, columns)
+        if rtl:
+            column = columns - 1 - column
+        with _open_page(data, max_width) as img:
+            canvas.paste(img.convert("RGB"), (column * (cell_width + gutter), row * (cell_height + gutter)))
+    return image_format.encode(canvas, quality)
+
+
+class _PdfWriter:
+    """
+    Minimal PDF writer for image-only documents.
+
+    Each page is a single JPEG image embedded with /DCTDecode, so the JPEG bytes
+    are copied into the file as-is. Objects are written as pages arrive.
+    """
+
+    def __init__(self, fp, num_pages):
+        self.fp = fp
+        self.num_pages = num_pages
+        self._offsets = {}
+        self._page_num = 0
+        fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # Objects 1 and 2 are the catalog and page tree; page i uses objects 3i..3i+2
+        kids = " ".join(f"{self._page_object(i) + 2} 0 R" for i in range(num_pages))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+
+    @staticmethod
+    def _page_object(index):
+        return 3 * index + 3
+
+    def _write_object(self, number, body, stream=None):
+        self._offsets[number] = self.fp.tell()
+        self.fp.write(f"{number} 0 obj\n".encode())
+        self.fp.write(body)
+        if stream is not None:
+            self.fp.write(b"\nstream\n")
+            self.fp.write(stream)
+            self.fp.write(b"\nendstream")
+        self.fp.write(b"\nendobj\n")
+
+    def add_page(self, jpeg, size, gray, dpi):
+        width, height = size
+        page_width = width * 72 / dpi
+        page_height = height * 72 / dpi
+        image = self._page_object(self._page_num)
+        self._page_num += 1
+
+        color_space = "/DeviceGray" if gray else "/DeviceRGB"
+        self._write_object(
+            image,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace {color_space} "
+            f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>".encode(),
+            jpeg,
+        )
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode()
+        self._write_object(image + 1, f"<< /Length {len(content)} >>".encode(), content)
+        self._write_object(
+            image + 2,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {image + 1} 0 R >>".encode(),
+        )
+
+    def close(self):
+        if self._page_num != self.num_pages:
+            raise ValueError(f"Expected {self.num_pages} pages, got {self._page_num}")
+        xref = self.fp.tell()
+        count = len(self._offsets) + 1
+        self.fp.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode())
+        for number in range(1, count):
+            self.fp.write(f"{self._offsets[number]:010d} 00000 n \n".encode())
+        self.fp.write(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def export_comic(pages, kind, image_format="jpeg", quality=None, **options):
+    """
+    Export the pages of a comic.
+
+    :param pages: Pages in reading order, as ImageBuffers or encoded bytes
+    :param kind: One of EXPORTERS: "pages", "cbz", "pdf", "strip" or "grid"
+    :param image_format: One of IMAGE_FORMATS: "png", "jpeg", "webp" or "avif"
+    :param quality: Encoder quality overriding the format's default (0-100)
+    :param options: Exporter-specific options, e.g. max_width, columns, rtl, title, language
+    :return: ExportFile
+    """
+    if kind not in EXPORTERS:
+        raise ValueError(f"Unknown export: {kind}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    exporter = EXPORTERS[kind]
+    fmt = IMAGE_FORMATS[image_format]
+    pages = [page.data if isinstance(page, ImageBuffer) else bytes(page) for page in pages]
+    data = exporter.function(pages, fmt, quality, **options)
+    name = exporter.filename.format(pages=len(pages), ext=fmt.extension)
+    return ExportFile(name, data, exporter.mime_type or fmt.mime_type)
+
+
+def export_options(kind, title="Manga", language="English"):
+    """Exporter options derived from the comic's metadata, for `export_comic(kind, ...)`."""
+    if kind == "cbz":
+        return {"title": title, "language": language}
+    if kind == "grid":
+        return {"rtl": language == "Japanese"}
+    return {}
+
+
+class ExportPool:
+    """
+    Runs exports in worker processes, so encoding large pages neither holds the
+    GIL nor blocks the UI or the generation event loop.
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        :param max_workers: Number of worker processes (default: CPU count, at most 4)
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        # "spawn" avoids forking a process that already runs threads (Streamlit, the janitor)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def warm(self):
+        """Start every worker process now, so the first export doesn't wait for them to spawn."""
+        return [self._executor.submit(_warm_up) for _ in range(self.max_workers)]
+
+    def submit(self, pages, kind, image_format="jpeg", quality=None, **options):
+        """Start an export; returns a concurrent.futures.Future resolving to an ExportFile."""
+        pages = [page.data if isinstance(page, ImageBuffer) else bytes(page) for page in pages]
+        return self._executor.submit(export_comic, pages, kind, image_format, quality, **options)
+
+    async def export(self, pages, kind, image_format="jpeg", quality=None, **options):
+        """Awaitable version of `submit`."""
+        return await asyncio.wrap_future(self.submit(pages, kind, image_format, quality, **options))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _warm_up():
+    # Load Pillow's codecs and plugins in the worker process
+    Image.init()
+
+
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+
+def get_export_pool():
+    """Return the process-wide ExportPool, creating it on first use."""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ExportPool()
+        return _export_pool
@@ -0,0 +1,62 @@
+import io
+
+from PIL import Image
+
+# Leading bytes of the encodings the image model can return
+_SIGNATURES = {
+    b"\x89PNG": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"RIFF": "image/webp",
+}
+
+
+class ImageBuffer:
+    """
+    An encoded image (PNG, JPEG, ...) kept in memory.
+
+    Generated pages are carried through the pipeline as the bytes returned by
+    the API, so they are never re-encoded. Pixels are decoded with `open`,
+    only where they are actually needed.
+    """
+
+    def __init__(self, data, mime_type=None):
+        """
+        :param data: Encoded image bytes
+        :param mime_type: MIME type of `data`; detected from its leading bytes if omitted
+        """
+        self.data = bytes(data)
+        self.mime_type = mime_type or _sniff_mime_type(self.data)
+
+    @classmethod
+    def from_part(cls, part):
+        """Build a buffer from a response part carrying inline image data."""
+        return cls(part.inline_data.data, part.inline_data.mime_type)
+
+    @classmethod
+    def from_image(cls, image, format="PNG", **save_options):
+        """Encode a PIL image once and wrap the result."""
+        buffer = io.BytesIO()
+        image.save(buffer, format, **save_options)
+        return cls(buffer.getvalue(), Image.MIME[format.upper()])
+
+    @property
+    def extension(self):
+        return "." + self.mime_type.split("/")[-1].replace("jpeg", "jpg")
+
+    def open(self):
+        """Return a new, lazily decoded PIL image that the caller owns."""
+        return Image.open(io.BytesIO(self.data))
+
+    def as_part(self):
+        """The image as a request part, sent without re-encoding."""
+        # google.genai takes most of a second to import; load it when a request is built
+        from google.genai import types
+
+        return types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+
+
+def _sniff_mime_type(data):
+    for signature, mime_type in _SIGNATURES.items():
+        if data.startswith(signature):
+            return mime_type
+    return "image/png"
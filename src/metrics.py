@@ -0,0 +1,379 @@
+"""
+Tracing and metrics for the generation pipeline.
+
+Every stage of a run (prompt build, plot call, split, page calls, saves,
+combine) is recorded as a span with its duration, status and attributes such
+as token usage and image bytes. Finished runs are appended to a JSONL trace
+file and aggregated into Prometheus text-format metrics, written to a file
+(for the node_exporter textfile collector) and optionally served over HTTP.
+
+Report p50/p95 per stage across the runs in a trace file:
+    python -m src.metrics report [metrics/traces.jsonl]
+"""
+
+import argparse
+import contextlib
+import contextvars
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# usage_metadata fields recorded on model call spans, and the attribute names they are stored under
+_USAGE_FIELDS = {
+    "prompt_token_count": "prompt_tokens",
+    "candidates_token_count": "output_tokens",
+    "thoughts_token_count": "thoughts_tokens",
+    "cached_content_token_count": "cached_tokens",
+    "total_token_count": "total_tokens",
+}
+
+_current_trace = contextvars.ContextVar("comic_trace", default=None)
+_current_span = contextvars.ContextVar("comic_span", default=None)
+
+
+class Span:
+    """One timed stage of a run. Attributes must be JSON-serializable."""
+
+    def __init__(self, name, parent_id, attrs):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_usage(self, usage_metadata):
+        """Copy token counts from a response's usage_metadata, if it has any."""
+        if usage_metadata is None:
+            return
+        for field, name in _USAGE_FIELDS.items():
+            value = getattr(usage_metadata, field, None)
+            if value is not None:
+                self.attrs[name] = value
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.status = "cancelled" if not isinstance(error, Exception) else "error"
+            self.error = str(error)[:500] or type(error).__name__
+
+    def to_dict(self, run_id):
+        return {
+            "run_id": run_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Returned by `span` outside a traced run, so callers never need to check."""
+
+    def set(self, **attrs):
+        pass
+
+    def record_usage(self, usage_metadata):
+        pass
+
+
+class Trace:
+    """The spans of one run."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Time the enclosed block as a stage of the current run.
+
+    Nested spans (including those in tasks and threads started inside the
+    block) record this span as their parent. Outside a traced run this does nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NoopSpan()
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_span.reset(token)
+        trace.add(current)
+
+
+class MetricsRegistry:
+    """Counters and histograms aggregated from finished runs, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # labels -> [bucket counts..., count, sum]
+
+    def record(self, trace):
+        with self._lock:
+            for s in trace.spans:
+                if s.duration is None:
+                    continue
+                if s.parent_id is None:
+                    self._counters[("comic_runs_total", (("status", s.status),))] += 1
+                self._observe((("stage", s.name),), s.duration)
+                model = s.attrs.get("model")
+                if model is None:
+                    continue
+                self._counters[("comic_model_calls_total", (("model", model), ("status", s.status)))] += 1
+                for name in _USAGE_FIELDS.values():
+                    if name in s.attrs and name != "total_tokens":
+                        kind = name[: -len("_tokens")]
+                        self._counters[("comic_model_tokens_total", (("model", model), ("type", kind)))] += s.attrs[name]
+                if "image_bytes" in s.attrs:
+                    self._counters[("comic_image_bytes_total", (("model", model),))] += s.attrs["image_bytes"]
+
+    def _observe(self, labels, value):
+        histogram = self._histograms.setdefault(labels, [0] * len(DURATION_BUCKETS) + [0, 0.0])
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += value
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        if histograms:
+            name = "comic_stage_duration_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in histograms:
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+class Tracer:
+    """
+    Records runs and exports them.
+
+    A tracer is thread-safe and meant to be shared by all runs in a process,
+    so its metrics cover the whole process.
+    """
+
+    def __init__(self, trace_path=None, metrics_path=None, max_trace_bytes=64 * 1024 * 1024):
+        """
+        :param trace_path: JSONL file every finished span is appended to (None to disable)
+        :param metrics_path: File rewritten with the Prometheus metrics after each run (None to disable)
+        :param max_trace_bytes: Size at which the trace file is rotated to `<trace_path>.1`
+        """
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.max_trace_bytes = max_trace_bytes
+        self.registry = MetricsRegistry()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a tracer configured by COMIC_TRACE_FILE and COMIC_METRICS_FILE (set
+        to an empty string to disable either), serving the metrics over HTTP on
+        COMIC_METRICS_PORT if it is set.
+        """
+        tracer = cls(
+            os.getenv("COMIC_TRACE_FILE", "metrics/traces.jsonl") or None,
+            os.getenv("COMIC_METRICS_FILE", "metrics/comic.prom") or None,
+        )
+        if os.getenv("COMIC_METRICS_PORT"):
+            tracer.serve(int(os.environ["COMIC_METRICS_PORT"]))
+        return tracer
+
+    @contextlib.contextmanager
+    def run(self, run_id=None, **attrs):
+        """
+        Trace the enclosed block as one run, recorded as a root "run" span with `attrs`.
+
+        The spans are exported when the block exits, whether it succeeded or not.
+        """
+        trace = Trace(run_id or uuid.uuid4().hex[:12])
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            with span("run", **attrs) as root:
+                yield root
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self.record(trace)
+
+    def record(self, trace):
+        self.registry.record(trace)
+        with self._lock:
+            if self.trace_path:
+                self._append_trace(trace)
+            if self.metrics_path:
+                _write_atomic(self.metrics_path, self.registry.render())
+
+    def _append_trace(self, trace):
+        os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.getsize(self.trace_path) > self.max_trace_bytes:
+                os.replace(self.trace_path, self.trace_path + ".1")
+        lines = "".join(json.dumps(s.to_dict(trace.run_id), ensure_ascii=False) + "\n" for s in trace.spans)
+        with open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the metrics at http://host:port/metrics from a daemon thread."""
+        registry = self.registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="comic-metrics", daemon=True).start()
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Return the process-wide Tracer configured from the environment.
+
+    Safe to call on every Streamlit rerun; the tracer (and its metrics) are created once.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer.from_env()
+        return _tracer
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list, `q` in [0, 100]."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def report(paths):
+    """Print count, error count, p50, p95 and max duration per stage, and token totals per model."""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    tokens = defaultdict(lambda: defaultdict(int))
+    runs = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                runs.add(record["run_id"])
+                if record["duration"] is not None:
+                    durations[record["name"]].append(record["duration"])
+                if record["status"] != "ok":
+                    errors[record["name"]] += 1
+                attrs = record["attrs"]
+                if "model" in attrs:
+                    for name in _USAGE_FIELDS.values():
+                        tokens[attrs["model"]][name] += attrs.get(name, 0)
+
+    print(f"{len(runs)} run(s)")
+    print(f"{'stage':<16} {'count':>6} {'errors':>6} {'p50 (s)':>8} {'p95 (s)':>8} {'max (s)':>8}")
+    for name, values in sorted(durations.items(), key=lambda item: -percentile(item[1], 50)):
+        print(
+            f"{name:<16} {len(values):>6} {errors[name]:>6} {percentile(values, 50):>8.2f} "
+            f"{percentile(values, 95):>8.2f} {max(values):>8.2f}"
+        )
+    for model, counts in sorted(tokens.items()):
+        totals = ", ".join(f"{name}={count}" for name, count in counts.items() if count)
+        if totals:
+            print(f"{model}: {totals}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="Aggregate stage timings across runs")
+    report_parser.add_argument(
+        "traces", nargs="*", default=[os.getenv("COMIC_TRACE_FILE", "metrics/traces.jsonl")], help="JSONL trace files"
+    )
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        report(args.traces)
+
+
+if __name__ == "__main__":
+    main()
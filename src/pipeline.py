@@ -0,0 +1,94 @@
+import asyncio
+
+from src.engine import GENERATION_MODES, IMAGE_MODEL, PLOT_MODEL, ComicEngine, ComicResult, ProgressCallback
+
+__all__ = [
+    "GENERATION_MODES",
+    "IMAGE_MODEL",
+    "PLOT_MODEL",
+    "ComicResult",
+    "ProgressCallback",
+    "generate_comic",
+    "resume_comic",
+]
+
+
+def generate_comic(
+    client,
+    num_pages,
+    theme,
+    additional_content="up to you",
+    character_image=None,
+    language="English",
+    image_size="1K",
+    workspace=None,
+    cache=None,
+    progress=None,
+    mode="chained",
+    retry_policy=None,
+    tracer=None,
+    scheduler=None,
+    postprocess=None,
+):
+    """
+    Generate a manga comic: plot → page prompts → page images → combined strip.
+
+    Synchronous wrapper around ComicEngine: runs one job on a private event loop
+    and blocks until it finishes. Pages are kept in memory as ImageBuffers
+    holding the bytes returned by the API, so nothing is re-encoded. If a
+    RunWorkspace is given, the job is checkpointed into it as it progresses and
+    the pages and combined comic are written there; see `resume_comic`.
+
+    Args:
+        client: google.genai Client
+        num_pages: Number of pages (1–7)
+        theme: Manga theme
+        additional_content: Additional story elements, or "up to you"
+        character_image: Optional ImageBuffer with a character design reference
+        language: "English" or "Japanese"
+        image_size: "1K", "2K" or "4K"
+        workspace: Optional RunWorkspace to persist the results into
+        cache: Optional GenerationCache consulted before every model call
+        progress: Optional ProgressCallback receiving progress events
+        mode: "chained" (each page references the previous one),
+              "windowed" (each page references the last 2 pages, without a chat) or
+              "parallel" (pages 2..N are generated concurrently from page 1)
+        retry_policy: Optional RetryPolicy, e.g. one shared across runs to aggregate its counters
+        tracer: Optional Tracer recording the stages of the run
+        scheduler: Optional RequestScheduler shared by all jobs of the process
+        postprocess: Optional PostProcessOptions applied to the pages before they are combined
+
+    Returns:
+        ComicResult
+    """
+    engine = ComicEngine(client, cache=cache, retry_policy=retry_policy, tracer=tracer, scheduler=scheduler)
+    return asyncio.run(
+        engine.generate(
+            num_pages,
+            theme,
+            additional_content,
+            character_image,
+            language,
+            image_size,
+            workspace=workspace,
+            progress=progress,
+            mode=mode,
+            postprocess=postprocess,
+        )
+    )
+
+
+def resume_comic(
+    client, workspace, cache=None, progress=None, retry_policy=None, tracer=None, scheduler=None, postprocess=None
+):
+    """
+    Resume a failed or interrupted job from the checkpoint in `workspace`.
+
+    The saved plot and completed pages are reused, so only the missing pages
+    are requested from the API.
+
+    Returns:
+        ComicResult
+    """
+    engine = ComicEngine(client, cache=cache, retry_policy=retry_policy, tracer=tracer, scheduler=scheduler)
+    return asyncio.run(engine.resume(workspace, progress=progress, postprocess=postprocess))
@@ -0,0 +1,349 @@
+"""
+Post-processing of generated pages before they are combined.
+
+The image model returns every page as a full-colour image, with uniform
+margins of varying size, even when the art is black and white. These steps
+run on the page pixels as NumPy arrays:
+
+    trim       crop uniform borders, keeping a margin, so panel frames are never cut
+    normalize  scale every page to the width of page 1, so the strip lines up
+    tone       "auto" stores near-monochrome pages as grayscale, "grayscale" always
+               does, "screentone" renders a 1-bit ordered-dither pattern
+    quantize   store the page with the smallest palette (gray levels or colours)
+               that stays within `max_error`, or as it is if none does
+
+Pages are processed in worker threads as soon as they are generated (NumPy
+and Pillow release the GIL for the heavy work), and a PageReport records the
+bytes saved on each page.
+"""
+
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+from src.image_buffer import ImageBuffer
+from src.metrics import span
+
+TONES = ("color", "auto", "grayscale", "screentone")
+
+# Palette sizes tried when quantizing, smallest first
+PALETTE_SIZES = (2, 4, 16, 32, 64, 128, 256)
+
+# Share of a row or column that must differ from the background for it to count as artwork,
+# so grain and compression noise in the margins don't stop the trim
+_TRIM_MIN_CONTENT = 0.002
+
+# Share of pixels that may be coloured in a page "auto" still treats as monochrome
+_MONOCHROME_MAX_COLORED = 0.01
+_MONOCHROME_CHROMA = 24
+
+# ITU-R BT.601 luma weights
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Lossy encodings of generated pages, kept when a processed page is re-encoded;
+# JPEG pages reuse their own quantization tables instead of `_LOSSY_QUALITY`
+_LOSSY_FORMATS = {"image/jpeg": "JPEG", "image/webp": "WEBP"}
+_LOSSY_QUALITY = 95
+
+# Palette errors are measured on every 4th row and column
+_ERROR_SAMPLE_STEP = 4
+
+
+def _bayer_matrix(size):
+    """Bayer ordered-dither matrix of `size` x `size` (a power of two), with values 0..size²-1."""
+    matrix = np.zeros((1, 1), dtype=np.int32)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+_SCREENTONE_THRESHOLDS = ((_bayer_matrix(8) + 0.5) * (255 / 64)).astype(np.float32)
+
+
+class PostProcessOptions:
+    """Which post-processing steps run on the pages of a comic."""
+
+    def __init__(
+        self,
+        trim=True,
+        normalize=True,
+        tone="auto",
+        quantize=True,
+        max_colors=256,
+        max_error=4.0,
+        trim_tolerance=24,
+        trim_margin=12,
+    ):
+        """
+        :param trim: Crop uniform borders around the artwork
+        :param normalize: Scale every page to the width of page 1
+        :param tone: "color", "auto" (grayscale for near-monochrome pages), "grayscale" or "screentone"
+        :param quantize: Store pages with the smallest palette within `max_error`
+        :param max_colors: Largest palette (gray levels or colours) to try, at most 256
+        :param max_error: Largest root-mean-square error (0-255 per channel) a palette may add
+        :param trim_tolerance: Difference from the border colour (0-255) above which a pixel is artwork
+        :param trim_margin: Pixels of border kept around the artwork
+        """
+        if tone not in TONES:
+            raise ValueError(f"Unknown tone: {tone}")
+        self.trim = trim
+        self.normalize = normalize
+        self.tone = tone
+        self.quantize = quantize
+        self.max_colors = max_colors
+        self.max_error = max_error
+        self.trim_tolerance = trim_tolerance
+        self.trim_margin = trim_margin
+
+
+class PageReport:
+    """Effect of post-processing on one page."""
+
+    def __init__(self, page_num, original_bytes, processed_bytes, original_size, size, mode):
+        self.page_num = page_num
+        self.original_bytes = original_bytes
+        self.processed_bytes = processed_bytes
+        self.original_size = original_size  # (width, height) as generated
+        self.size = size  # (width, height) after trimming and scaling
+        self.mode = mode  # PIL mode of the stored page ("RGB", "L", "P", "1"), None if kept as generated
+
+    @property
+    def saved_bytes(self):
+        return self.original_bytes - self.processed_bytes
+
+    def to_dict(self):
+        return {
+            "page": self.page_num,
+            "original_bytes": self.original_bytes,
+            "processed_bytes": self.processed_bytes,
+            "original_size": list(self.original_size),
+            "size": list(self.size),
+            "mode": self.mode,
+        }
+
+
+class PagePostProcessor:
+    """
+    Post-processes the pages of one comic in worker threads as they are submitted.
+
+    Must be created and used on the event loop running the comic's job.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self._width = asyncio.get_running_loop().create_future()
+        self._tasks = {}
+
+    def submit(self, page_num, page, callback=None):
+        """
+        Start post-processing page `page_num` (an ImageBuffer).
+
+        :param callback: Optional callable receiving the processed ImageBuffer, called on the event loop
+        """
+        self._tasks[page_num] = asyncio.ensure_future(self._process(page_num, page, callback))
+
+    async def _process(self, page_num, page, callback):
+        options = self.options
+        with span("postprocess_page", page=page_num) as page_span:
+            pixels, original_size = await asyncio.to_thread(_prepare, page, options)
+            width = None
+            if options.normalize:
+                if page_num == 1:
+                    self._width.set_result(pixels.shape[1])
+                width = await asyncio.shield(self._width)
+            processed, report = await asyncio.to_thread(_finish, page_num, page, pixels, original_size, options, width)
+            page_span.set(bytes_in=report.original_bytes, bytes_out=report.processed_bytes, mode=report.mode)
+        if callback is not None:
+            callback(processed)
+        return processed, report
+
+    async def results(self):
+        """Wait for every submitted page; return the processed pages and their PageReports, in page order."""
+        results = await asyncio.gather(*(self._tasks[page_num] for page_num in sorted(self._tasks)))
+        pages = [processed for processed, _ in results]
+        reports = [report for _, report in results]
+        return pages, reports
+
+    def cancel(self):
+        """Stop pages still being processed, e.g. because the job failed."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # The job's own error is the one reported
+                task.exception()
+
+
+def trim_box(pixels, tolerance=24, margin=12):
+    """
+    Bounding box (left, top, right, bottom) of the artwork in an RGB array.
+
+    The background is the median colour of the outermost rows and columns.
+    Only rows and columns that (nearly) all match it are cut, and `margin`
+    pixels of them are kept, so panel frames and art reaching the edge stay
+    intact. A page without a uniform border keeps its full size.
+    """
+    height, width = pixels.shape[:2]
+    edge = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(edge, axis=0)
+    low = np.clip(background - tolerance, 0, 255).astype(np.uint8)
+    high = np.clip(background + tolerance, 0, 255).astype(np.uint8)
+    # Channel by channel: reductions over the short last axis are slow in NumPy
+    content = np.zeros((height, width), dtype=bool)
+    for channel in range(3):
+        content |= (pixels[..., channel] < low[channel]) | (pixels[..., channel] > high[channel])
+    rows = np.flatnonzero(np.count_nonzero(content, axis=1) > width * _TRIM_MIN_CONTENT)
+    cols = np.flatnonzero(np.count_nonzero(content, axis=0) > height * _TRIM_MIN_CONTENT)
+    if not rows.size or not cols.size:
+        return 0, 0, width, height
+    return (
+        max(int(cols[0]) - margin, 0),
+        max(int(rows[0]) - margin, 0),
+        min(int(cols[-1]) + 1 + margin, width),
+        min(int(rows[-1]) + 1 + margin, height),
+    )
+
+
+def is_monochrome(pixels):
+    """Whether an RGB array is (nearly) free of colour, e.g. a black-and-white manga page."""
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    chroma = np.maximum(np.maximum(red, green), blue) - np.minimum(np.minimum(red, green), blue)
+    return np.count_nonzero(chroma > _MONOCHROME_CHROMA) <= chroma.size * _MONOCHROME_MAX_COLORED
+
+
+def grayscale(pixels):
+    """Luminance of an RGB array, as uint8."""
+    return np.clip(np.rint(pixels @ _LUMA), 0, 255).astype(np.uint8)
+
+
+def screentone(gray):
+    """Render a grayscale array as a 1-bit ordered-dither pattern, like printed screentone."""
+    height, width = gray.shape
+    tiles = (height // 8 + 1, width // 8 + 1)
+    thresholds = np.tile(_SCREENTONE_THRESHOLDS, tiles)[:height, :width]
+    return Image.fromarray(gray > thresholds)
+
+
+def quantize_gray(gray, max_levels=256, max_error=4.0):
+    """
+    Map a grayscale array to the fewest evenly spaced gray levels within
+    `max_error`, as a palette image. Errors are computed from the histogram.
+
+    :return: A "P" image, or None if more than `max_levels` levels are needed
+    """
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    values = np.arange(256)
+    for levels in PALETTE_SIZES:
+        if levels > max_levels:
+            break
+        step = 255 / (levels - 1)
+        index = np.rint(values / step)
+        error = np.sqrt((histogram * (values - index * step) ** 2).sum() / gray.size)
+        if error <= max_error:
+            img = Image.frombytes("P", (gray.shape[1], gray.shape[0]), index.astype(np.uint8)[gray].tobytes())
+            ramp = np.rint(np.arange(levels) * step).astype(np.uint8)
+            img.putpalette(np.repeat(ramp, 3).tobytes())
+            return img
+    return None
+
+
+def quantize_color(pixels, max_colors=256, max_error=4.0):
+    """
+    Quantize an RGB array to the smallest adaptive (octree) palette within `max_error`.
+
+    :return: A "P" image, or None if even `max_colors` colours are not accurate enough
+    """
+    img = Image.fromarray(pixels)
+    sample = pixels[::_ERROR_SAMPLE_STEP, ::_ERROR_SAMPLE_STEP].astype(np.int16)
+
+    def attempt(colors):
+        quantized = img.quantize(colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        palette = np.array(quantized.getpalette(), dtype=np.int16).reshape(-1, 3)
+        indices = np.asarray(quantized)[::_ERROR_SAMPLE_STEP, ::_ERROR_SAMPLE_STEP]
+        error = np.sqrt(np.mean((palette[indices] - sample) ** 2))
+        return quantized if error <= max_error else None
+
+    # Most pages either fit a small palette or no palette at all: rule out the latter first
+    sizes = [colors for colors in PALETTE_SIZES if 16 <= colors <= max_colors]
+    if not sizes or attempt(sizes[-1]) is None:
+        return None
+    for colors in sizes:
+        quantized = attempt(colors)
+        if quantized is not None:
+            return quantized
+    return None
+
+
+def _prepare(page, options):
+    """Decode a page into an RGB array and trim it. Returns the array and the original size."""
+    with page.open() as img:
+        original_size = img.size
+        if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+            # Flatten transparency onto white paper
+            rgba = img.convert("RGBA")
+            img = Image.alpha_composite(Image.new("RGBA", rgba.size, "white"), rgba)
+        pixels = np.asarray(img.convert("RGB"))
+    if options.trim:
+        left, top, right, bottom = trim_box(pixels, options.trim_tolerance, options.trim_margin)
+        pixels = pixels[top:bottom, left:right]
+    return pixels, original_size
+
+
+def _finish(page_num, page, pixels, original_size, options, width=None):
+    """
+    Scale, tone and quantize a prepared page, and encode it.
+
+    A page that was neither trimmed nor scaled is kept as generated when
+    palette or "auto" tone processing would only make it larger.
+    """
+    height = pixels.shape[0]
+    if width and pixels.shape[1] != width:
+        height = max(1, round(pixels.shape[0] * width / pixels.shape[1]))
+        scaled = Image.fromarray(pixels).resize((width, height), Image.Resampling.LANCZOS)
+        pixels = np.asarray(scaled)
+
+    img = None
+    if options.tone == "screentone":
+        img = screentone(grayscale(pixels))
+    elif options.tone == "grayscale" or (options.tone == "auto" and is_monochrome(pixels)):
+        gray = grayscale(pixels)
+        if options.quantize:
+            img = quantize_gray(gray, options.max_colors, options.max_error)
+        if img is None:
+            img = Image.fromarray(gray)
+    elif options.quantize:
+        img = quantize_color(pixels, options.max_colors, options.max_error)
+
+    size = (pixels.shape[1], pixels.shape[0])
+    if img is None and size == original_size:
+        # Nothing changed: keep the page as generated rather than re-encoding it
+        return page, PageReport(page_num, len(page.data), len(page.data), original_size, original_size, None)
+
+    if img is None:
+        img = Image.fromarray(pixels)
+    processed = _encode(img, page)
+    reencoded_only = size == original_size and options.tone not in ("grayscale", "screentone")
+    if reencoded_only and len(processed.data) >= len(page.data):
+        # Only the encoding changed (a palette, or "auto" grayscale) and it doesn't pay: keep the page as generated.
+        # A trimmed or scaled page always keeps its new pixels, so the pages still line up.
+        return page, PageReport(page_num, len(page.data), len(page.data), original_size, original_size, None)
+    return processed, PageReport(page_num, len(page.data), len(processed.data), original_size, size, img.mode)
+
+
+def _encode(img, page):
+    """
+    Encode a processed page. Palette and 1-bit pages are stored as PNG; other
+    pages keep the encoding of the generated page, so a trimmed JPEG stays a
+    JPEG, at the quality it was generated with.
+    """
+    if img.mode in ("P", "1") or page.mime_type == "image/png":
+        return ImageBuffer.from_image(img, "PNG")
+    if page.mime_type == "image/jpeg":
+        with page.open() as source:
+            qtables = getattr(source, "quantization", None)
+        if qtables:
+            # Grayscale JPEGs only have a luminance table
+            qtables = [qtables[0]] if img.mode == "L" else list(qtables.values())
+            return ImageBuffer.from_image(img, "JPEG", qtables=qtables)
+    return ImageBuffer.from_image(img, _LOSSY_FORMATS.get(page.mime_type, "PNG"), quality=_LOSSY_QUALITY)
@@ -0,0 +1,99 @@
+import os
+
+from PIL import Image
+
+from src.cache import GenerationCache
+from src.image_buffer import ImageBuffer
+
+# Widths of the versions sent to the browser. Thumbnails fill a gallery column;
+# display versions are sharp at the width of the main content area.
+THUMBNAIL_WIDTH = 320
+DISPLAY_WIDTH = 960
+
+
+class PagePreview:
+    """Browser-sized versions of one page: a gallery thumbnail and a display version."""
+
+    def __init__(self, thumbnail, display):
+        self.thumbnail = thumbnail
+        self.display = display
+
+
+class PreviewGenerator:
+    """
+    Makes small JPEG versions of pages for display, so full-resolution images
+    only leave the server as downloads.
+
+    Each page is decoded once to produce both versions, and the results are
+    kept in a GenerationCache keyed by the page bytes, so resumed runs, cache
+    hits and reruns never resize the same page twice.
+    """
+
+    def __init__(self, cache=None, thumbnail_width=THUMBNAIL_WIDTH, display_width=DISPLAY_WIDTH, quality=85):
+        """
+        :param cache: Optional GenerationCache the previews are stored in
+        :param thumbnail_width: Maximum width of gallery thumbnails
+        :param display_width: Maximum width of display versions
+        :param quality: JPEG quality of both versions
+        """
+        self.cache = cache
+        self.thumbnail_width = thumbnail_width
+        self.display_width = display_width
+        self.quality = quality
+
+    @classmethod
+    def from_env(cls):
+        """Create a generator cached in COMIC_PREVIEW_CACHE_DIR, bounded by COMIC_PREVIEW_CACHE_MAX_MB."""
+        cache = GenerationCache(
+            os.getenv("COMIC_PREVIEW_CACHE_DIR", ".cache/previews"),
+            max_bytes=int(os.getenv("COMIC_PREVIEW_CACHE_MAX_MB", "256")) * 1024 * 1024,
+            max_age=float(os.getenv("COMIC_CACHE_MAX_AGE_HOURS", "168")) * 3600,
+        )
+        return cls(cache)
+
+    def page(self, image):
+        """Return the PagePreview of an ImageBuffer, from the cache when possible."""
+        cache = self.cache
+        keys = None
+        if cache:
+            keys = [
+                cache.make_key("preview", image, (width, self.quality))
+                for width in (self.thumbnail_width, self.display_width)
+            ]
+            cached = [cache.get(key) for key in keys]
+            if None not in cached:
+                return PagePreview(*(ImageBuffer(data, "image/jpeg") for data in cached))
+
+        preview = self._render(image)
+        if cache:
+            cache.put(keys[0], preview.thumbnail.data)
+            cache.put(keys[1], preview.display.data)
+        return preview
+
+    def _render(self, image):
+        with image.open() as img:
+            # thumbnail() decodes JPEGs at reduced size and shrinks in cheap integer steps first
+            img.thumbnail((self.display_width, img.height * self.display_width // img.width))
+            display = img.convert("RGB")
+        thumbnail = display.copy()
+        thumbnail.thumbnail((self.thumbnail_width, display.height))
+        return PagePreview(
+            ImageBuffer.from_image(thumbnail, "JPEG", quality=self.quality),
+            # Progressive, so the browser can paint a coarse version while it loads
+            ImageBuffer.from_image(display, "JPEG", quality=self.quality, optimize=True, progressive=True),
+        )
+
+    def strip(self, previews):
+        """Stack the display versions of `previews` into a preview of the combined comic."""
+        images = [preview.display.open() for preview in previews]
+        try:
+            width = max(img.width for img in images)
+            strip = Image.new("RGB", (width, sum(img.height for img in images)), "white")
+            top = 0
+            for img in images:
+                strip.paste(img, (0, top))
+                top += img.height
+        finally:
+            for img in images:
+                img.close()
+        return ImageBuffer.from_image(strip, "JPEG", quality=self.quality, optimize=True, progressive=True)
@@ -1,5 +1,249 @@
 import re
-from typing import Dict
+import unicodedata
+from typing import Dict, List
+
+# A page heading on its own line. Matched against the NFKC-normalized line, so
+# full-width brackets, colons and digits ("［Ｐａｇｅ　１］") are covered too.
+# Accepted forms include "[Page 1]", "**[Page 1]**", "## Page 1", "Page 1:",
+# "【Page 1】", "[ページ1]", "ページ 1", "1ページ目" and "第1ページ".
+# Leading and trailing markdown decoration is stripped with str methods rather
+# than by the pattern, which keeps matching linear on pathological lines.
+_HEADING_DECORATION = " \t#>*_"
+_HEADING_LINE = re.compile(
+    r"(?P<open>[\[【(])?[ \t*_]*(?:(?:page|pg\.?|ページ)\s*(?P<num>\d+)|第?\s*(?P<jnum>\d+)\s*ページ目?)(?P<tail>.*)",
+    re.IGNORECASE,
+)
+_HEADING_CLOSE = ("]", "】", ")")
+# Without brackets, "Page 1" must be followed by a separator (or nothing) to
+# count as a heading, so prose such as "Page 1 opens with..." is not split.
+_HEADING_SEPARATORS = (":", "(", "-", "–", "—", "/")
+
+_TITLE_LINE = re.compile(r"^[\s*_\-•]*(?:title|タイトル)[\s*_]*:(?P<title>.*)", re.IGNORECASE)
+_PANEL_LINE = re.compile(r"^[\s*_\-•→#]*(?:(?:panel|コマ)\s*\d+|\d+\s*コマ目)", re.IGNORECASE)
+# Openers are excluded inside each quote so unbalanced quotes cannot cause rescans
+_DIALOGUE = re.compile(r"「([^「」]*)」|『([^『』]*)』|“([^“”]*)”|\"([^\"\n]*)\"")
+
+
+class PlotFormatError(ValueError):
+    """The plot does not contain exactly the pages 1..N the comic needs."""
+
+
+class PageSpec:
+    """One page of a parsed plot."""
+
+    def __init__(self, number, heading, text, title=None, panels=None, dialogue=None):
+        """
+        :param number: Page number from the heading
+        :param heading: The heading line as written by the model
+        :param text: The full block (heading + content), used as the page prompt
+        :param title: Manga title, if the block contains a "Title:" line
+        :param panels: List of panel descriptions, if the block is split into panels
+        :param dialogue: List of quoted lines of dialogue found in the block
+        """
+        self.number = number
+        self.heading = heading
+        self.text = text
+        self.title = title
+        self.panels = panels or []
+        self.dialogue = dialogue or []
+
+    @property
+    def key(self):
+        return f"page{self.number}"
+
+    def to_dict(self):
+        return {
+            "number": self.number,
+            "title": self.title,
+            "panels": self.panels,
+            "dialogue": self.dialogue,
+            "text": self.text,
+        }
+
+
+def _match_heading(line):
+    """Return the page number if `line` is a page heading, otherwise None."""
+    normalized = unicodedata.normalize("NFKC", line).lstrip(_HEADING_DECORATION)
+    m = _HEADING_LINE.match(normalized)
+    if m is None:
+        return None
+    rest = m.group("tail").lstrip(_HEADING_DECORATION)
+    bracketed = m.group("open") is not None and rest.startswith(_HEADING_CLOSE)
+    if bracketed:
+        rest = rest[1:]
+    rest = rest.strip(_HEADING_DECORATION)
+    if not bracketed and rest and not rest.startswith(_HEADING_SEPARATORS):
+        return None
+    return int(m.group("num") or m.group("jnum"))
+
+
+def _build_page(number, lines):
+    """Turn the lines of one page block into a PageSpec."""
+    title = None
+    panels = []
+    dialogue = []
+    for line in lines[1:]:
+        normalized = unicodedata.normalize("NFKC", line)
+        if title is None:
+            m = _TITLE_LINE.match(normalized)
+            if m and m.group("title").strip(_HEADING_DECORATION):
+                title = m.group("title").strip(_HEADING_DECORATION)
+                continue
+        if _PANEL_LINE.match(normalized):
+            panels.append(line.strip())
+        elif panels and line.strip():
+            panels[-1] += "\n" + line.strip()
+        for quote in _DIALOGUE.findall(line):
+            dialogue.append("".join(quote))
+    return PageSpec(
+        number,
+        lines[0].strip(),
+        "\n".join(lines).strip(),
+        title=title,
+        panels=panels,
+        dialogue=dialogue,
+    )
+
+
+class PageStreamSplitter:
+    """
+    Single-pass plot parser for text that arrives in chunks.
+
+    Feed it the chunks of a streamed plot; each page block is emitted as a
+    PageSpec as soon as the next page heading appears (or the stream ends).
+    Text is processed line by line, so headings split across chunk boundaries
+    are handled and every character is scanned once. Text before the first
+    heading is ignored.
+
+    `headings` lists the page numbers of all headings seen so far, including
+    the page still being streamed, so callers can check the page order early.
+    """
+
+    def __init__(self):
+        self.headings = []
+        self._partial = []  # Pieces of the current, unterminated line
+        self._number = None
+        self._lines = []
+
+    def feed(self, chunk):
+        """
+        Add a chunk of text.
+
+        :return: List of PageSpecs for every page completed by this chunk
+        """
+        if "\n" not in chunk:
+            self._partial.append(chunk)
+            return []
+        first, *lines, last = chunk.split("\n")
+        self._partial.append(first)
+        lines.insert(0, "".join(self._partial))
+        self._partial = [last]
+        pages = []
+        for line in lines:
+            page = self._feed_line(line)
+            if page is not None:
+                pages.append(page)
+        return pages
+
+    def close(self):
+        """
+        Signal the end of the stream.
+
+        :return: List with the PageSpec of the last page, if any
+        """
+        pages = []
+        last_line = "".join(self._partial)
+        self._partial = []
+        for page in (self._feed_line(last_line), self._flush()):
+            if page is not None:
+                pages.append(page)
+        return pages
+
+    def _feed_line(self, line):
+        line = line.rstrip("\r")
+        number = _match_heading(line)
+        if number is None:
+            if self._number is not None:
+                self._lines.append(line)
+            return None
+        finished = self._flush()
+        self.headings.append(number)
+        self._number = number
+        self._lines = [line]
+        return finished
+
+    def _flush(self):
+        if self._number is None:
+            return None
+        page = _build_page(self._number, self._lines)
+        self._number = None
+        self._lines = []
+        return page
+
+
+def parse_pages(text: str) -> List[PageSpec]:
+    """
+    Parse a plot into its pages, in the order they appear.
+
+    Tolerates common variants of the "[Page N]" heading (markdown emphasis,
+    "Page N:", full-width or 【】 brackets, Japanese "ページ"). Duplicate pages
+    are kept; use `validate_pages` to check the result.
+    """
+    splitter = PageStreamSplitter()
+    return splitter.feed(text) + splitter.close()
+
+
+def _plot_error(missing=(), duplicates=()):
+    problems = []
+    if missing:
+        problems.append(f"missing page(s) {', '.join(map(str, missing))}")
+    if duplicates:
+        problems.append(f"duplicate page(s) {', '.join(map(str, duplicates))}")
+    return PlotFormatError(f"The generated plot has {' and '.join(problems)}")
+
+
+def check_page_order(numbers, num_pages):
+    """
+    Check that page headings seen so far run 1, 2, 3, ... without gaps or repeats.
+
+    Meant for a plot that is still streaming: a broken plot is rejected as soon
+    as the offending heading appears. Numbers above `num_pages` are ignored.
+
+    :param numbers: Page numbers of the headings, in the order they appeared
+    :raises PlotFormatError: If a page is skipped or repeated
+    """
+    expected = 1
+    for number in numbers:
+        if not 1 <= number <= num_pages:
+            continue
+        if number < expected:
+            raise _plot_error(duplicates=[number])
+        if number > expected:
+            raise _plot_error(missing=range(expected, number))
+        expected += 1
+
+
+def validate_pages(pages: List[PageSpec], num_pages: int) -> Dict[int, PageSpec]:
+    """
+    Check that pages 1..num_pages are each present exactly once.
+
+    Pages numbered above `num_pages` are ignored.
+
+    :return: Dict of page number -> PageSpec for pages 1..num_pages
+    :raises PlotFormatError: If a page is missing or appears more than once
+    """
+    by_number = {}
+    duplicates = set()
+    for page in pages:
+        if page.number in by_number:
+            duplicates.add(page.number)
+        by_number.setdefault(page.number, page)
+
+    missing = [n for n in range(1, num_pages + 1) if n not in by_number]
+    duplicates = sorted(n for n in duplicates if n <= num_pages)
+    if missing or duplicates:
+        raise _plot_error(missing, duplicates)
+    return {n: by_number[n] for n in range(1, num_pages + 1)}
 
 
 def split_pages(text: str) -> Dict[str, str]:
@@ -8,21 +252,7 @@ def split_pages(text: str) -> Dict[str, str]:
     and store each full block (including the heading) in a dictionary.
     The heading and body are kept together — the entire block is stored as-is.
     Keys are normalized to lowercase without spaces, e.g., "page1", "page2", etc.
-    """
-    # Split right before each [Page X] (positive lookahead)
-    blocks = re.split(r"(?=\[Page\s+\d+\])", text)
-
-    pages = {}
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        # Extract the page number from the heading like [Page 1]
-        m = re.match(r"\[Page\s+(\d+)\]", block)
-        if m:
-            num = m.group(1)  # "1", "2", ...
-            key = f"page{num}"  # "page1", "page2", etc.
-            pages[key] = block  # Store the entire block (heading + content)
 
-    return pages
+    See `parse_pages` for the accepted heading variants and for structured output.
+    """
+    return {page.key: page.text for page in parse_pages(text)}
@@ -0,0 +1,188 @@
+import asyncio
+import random
+import threading
+from collections import Counter
+
+# HTTP status codes worth retrying: timeouts, rate limits and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Finish / block reasons that mean the request will never succeed as-is
+_BLOCKED_REASONS = {
+    "SAFETY",
+    "IMAGE_SAFETY",
+    "PROHIBITED_CONTENT",
+    "IMAGE_PROHIBITED_CONTENT",
+    "BLOCKLIST",
+    "SPII",
+    "RECITATION",
+    "IMAGE_RECITATION",
+}
+
+
+class EmptyResponseError(ValueError):
+    """The model answered without usable content (no parts, no image). Usually transient."""
+
+
+class SafetyBlockedError(RuntimeError):
+    """The request or its output was blocked by a safety filter. Retrying will not help."""
+
+
+def check_blocked(response):
+    """Raise SafetyBlockedError if `response` was blocked by the prompt or output filters."""
+    feedback = getattr(response, "prompt_feedback", None)
+    block_reason = getattr(feedback, "block_reason", None)
+    if block_reason:
+        raise SafetyBlockedError(f"Prompt blocked: {getattr(block_reason, 'name', block_reason)}")
+    for candidate in getattr(response, "candidates", None) or []:
+        finish_reason = getattr(candidate, "finish_reason", None)
+        name = getattr(finish_reason, "name", finish_reason)
+        if name in _BLOCKED_REASONS and not getattr(candidate, "content", None):
+            raise SafetyBlockedError(f"Output blocked: {name}")
+
+
+def classify_error(error):
+    """
+    Decide whether `error` is worth retrying.
+
+    :return: Tuple of (retryable, reason, retry_after). `reason` is a short label used
+             for counters and `retry_after` is the server's suggested delay in seconds, or None.
+    """
+    # Imported here so importing this module (and the engine) stays cheap
+    import httpx
+    from google.genai import errors
+
+    if isinstance(error, SafetyBlockedError):
+        return False, "safety", None
+    if isinstance(error, EmptyResponseError):
+        return True, "empty", None
+    if isinstance(error, errors.APIError):
+        reason = str(error.code)
+        if error.code in (401, 403):
+            return False, "auth", None
+        return error.code in RETRYABLE_STATUS_CODES, reason, _retry_after(error)
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True, "network", None
+    return False, type(error).__name__, None
+
+
+def _retry_after(error):
+    """Extract a retry delay from the Retry-After header or a google.rpc.RetryInfo detail."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+
+    details = error.details.get("error", error.details) if isinstance(error.details, dict) else {}
+    for detail in details.get("details", []) if isinstance(details, dict) else []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+class RetryError(RuntimeError):
+    """A request failed for good, either with a fatal error or after exhausting its attempts."""
+
+    def __init__(self, message, attempts, cause):
+        super().__init__(message)
+        self.attempts = attempts
+        self.cause = cause
+
+
+class RetryPolicy:
+    """
+    Retries model calls with exponential backoff and jitter.
+
+    Errors are classified as retryable (rate limits, 5xx, timeouts, empty
+    responses) or fatal (safety blocks, auth, bad requests). Retry-after hints
+    from the server take precedence over the computed backoff. The number of
+    attempts can be set per model, and counters are kept per model.
+    A policy is thread-safe and can be shared by all jobs in a process.
+    """
+
+    def __init__(
+        self,
+        max_attempts=4,
+        base_delay=2.0,
+        max_delay=30.0,
+        max_retry_after=120.0,
+        model_attempts=None,
+        sleep=asyncio.sleep,
+        rng=random.random,
+    ):
+        """
+        :param max_attempts: Total attempts per request (including the first one)
+        :param base_delay: Delay in seconds before the first retry; doubled on each attempt
+        :param max_delay: Upper bound for the computed backoff, in seconds
+        :param max_retry_after: Upper bound for server-provided retry-after hints, in seconds
+        :param model_attempts: Dict of model name -> max_attempts overriding the default
+        :param sleep: Coroutine function used to wait (replaceable in tests)
+        :param rng: Function returning a float in [0, 1) used for jitter
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.model_attempts = model_attempts or {}
+        self._sleep = sleep
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def attempts_for(self, model):
+        return self.model_attempts.get(model, self.max_attempts)
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retry number `attempt` (1-based), using "equal jitter"."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + self._rng() * delay / 2
+
+    def _count(self, model, key):
+        with self._lock:
+            self._counters.setdefault(model, Counter())[key] += 1
+
+    async def run(self, model, request, on_retry=None):
+        """
+        Await `request()` until it succeeds, fails fatally or runs out of attempts.
+
+        :param model: Model name, used for per-model attempts and counters
+        :param request: Coroutine factory performing one attempt; it should raise
+                        EmptyResponseError / SafetyBlockedError for unusable responses
+        :param on_retry: Optional callback(attempt, max_attempts, error, delay) called before each retry
+        :return: The result of the first successful attempt
+        :raises RetryError: When the request fails for good
+        """
+        max_attempts = self.attempts_for(model)
+        for attempt in range(1, max_attempts + 1):
+            self._count(model, "attempts")
+            try:
+                result = await request()
+            except Exception as e:
+                retryable, reason, retry_after = classify_error(e)
+                self._count(model, f"error:{reason}")
+                if not retryable:
+                    self._count(model, "fatal")
+                    raise RetryError(str(e), attempt, e) from e
+                if attempt == max_attempts:
+                    self._count(model, "exhausted")
+                    raise RetryError(str(e), attempt, e) from e
+
+                delay = self.backoff(attempt, retry_after)
+                self._count(model, "retries")
+                if on_retry is not None:
+                    on_retry(attempt, max_attempts, e, delay)
+                await self._sleep(delay)
+            else:
+                self._count(model, "successes")
+                return result
+
+    def stats(self):
+        """Return a copy of the counters: {model: {"attempts": n, "retries": n, "error:429": n, ...}}."""
+        with self._lock:
+            return {model: dict(counter) for model, counter in self._counters.items()}
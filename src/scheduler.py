@@ -0,0 +1,297 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+from src.engine import IMAGE_MODEL, PLOT_MODEL
+
+_current_job = contextvars.ContextVar("comic_job", default=None)
+
+
+class ModelLimit:
+    """Request limits of one model: requests per minute and requests in flight."""
+
+    def __init__(self, rpm=None, concurrency=4, burst=None):
+        """
+        :param rpm: Requests per minute, or None for no rate limit
+        :param concurrency: Maximum requests in flight
+        :param burst: Requests that may start at once after an idle period (default: `concurrency`)
+        """
+        self.rpm = rpm
+        self.concurrency = concurrency
+        self.burst = burst or concurrency
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`.
+
+    Not thread-safe on its own; RequestScheduler guards it with its lock.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` tokens are available (0 if they are available now)."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server answered with a rate limit error."""
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class QueueStatus:
+    """Where a job's oldest waiting request stands in a model's queue."""
+
+    def __init__(self, model, position, eta):
+        self.model = model
+        self.position = position  # Jobs served before this one
+        self.eta = eta  # Estimated seconds until the request starts
+
+
+class _Waiter:
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+class _ModelQueue:
+    """Waiting requests of one model, grouped by job and served round-robin across jobs."""
+
+    def __init__(self, limit, clock):
+        self.limit = limit
+        self.bucket = TokenBucket(limit.rpm / 60, limit.burst, clock) if limit.rpm else None
+        self.in_flight = 0
+        self.jobs = collections.OrderedDict()  # job -> deque of _Waiter, in service order
+        self.mean_duration = None
+
+    def rate_delay(self, tokens=1):
+        return self.bucket.delay(tokens) if self.bucket else 0.0
+
+    def observe(self, duration):
+        """Track an exponentially weighted mean of request durations for wait estimates."""
+        if self.mean_duration is None:
+            self.mean_duration = duration
+        else:
+            self.mean_duration += 0.2 * (duration - self.mean_duration)
+
+
+class RequestScheduler:
+    """
+    Process-wide gate in front of every model call.
+
+    Each model has a token bucket (requests per minute) and a cap on requests
+    in flight. Waiting requests are grouped by job and served round-robin, so
+    a job with many pages queued gets one request through per turn and cannot
+    starve smaller jobs. A scheduler is thread-safe and can be shared by jobs
+    running on different event loops (e.g. one per Streamlit session); a
+    dispatcher thread hands out slots as tokens refill.
+    """
+
+    def __init__(self, limits=None, default_limit=None, clock=time.monotonic):
+        """
+        :param limits: Dict of model name -> ModelLimit
+        :param default_limit: ModelLimit of models missing from `limits` (4 in flight, no rate limit)
+        :param clock: Monotonic clock, in seconds
+        """
+        self.limits = limits or {}
+        self.default_limit = default_limit or ModelLimit()
+        self.clock = clock
+        self.granted = collections.Counter()
+        self._queues = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._next_wake = float("inf")
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a scheduler limited by COMIC_PLOT_RPM / COMIC_PLOT_CONCURRENCY and
+        COMIC_IMAGE_RPM / COMIC_IMAGE_CONCURRENCY. Set the RPM to 0 to disable rate limiting.
+        """
+        return cls(
+            {
+                PLOT_MODEL: ModelLimit(
+                    int(os.getenv("COMIC_PLOT_RPM", "25")) or None, int(os.getenv("COMIC_PLOT_CONCURRENCY", "8"))
+                ),
+                IMAGE_MODEL: ModelLimit(
+                    int(os.getenv("COMIC_IMAGE_RPM", "20")) or None, int(os.getenv("COMIC_IMAGE_CONCURRENCY", "8"))
+                ),
+            }
+        )
+
+    @contextlib.contextmanager
+    def job(self, key):
+        """Attribute the model calls made in the enclosed block (and tasks it starts) to job `key`."""
+        token = _current_job.set(key)
+        try:
+            yield
+        finally:
+            _current_job.reset(token)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model):
+        """Wait for the turn of the current job on `model`, and hold the slot for the enclosed call."""
+        await self._acquire(model, _current_job.get())
+        started = self.clock()
+        try:
+            yield
+        except Exception as e:
+            if getattr(e, "code", None) == 429:
+                # The quota is tighter than configured: make everyone wait for fresh tokens
+                with self._cond:
+                    queue = self._queue(model)
+                    if queue.bucket:
+                        queue.bucket.drain()
+            raise
+        finally:
+            self._release(model, self.clock() - started)
+
+    def status(self, key):
+        """
+        Return the QueueStatus of job `key`, or None if it has no request waiting.
+
+        When a job waits on several models, the status with the longest wait is returned.
+        """
+        worst = None
+        with self._cond:
+            for model, queue in self._queues.items():
+                if key not in queue.jobs:
+                    continue
+                position = list(queue.jobs).index(key)
+                eta = self._estimate_wait(queue, position)
+                if worst is None or eta > worst.eta:
+                    worst = QueueStatus(model, position, eta)
+        return worst
+
+    def _estimate_wait(self, queue, position):
+        # The job's request starts after one request of every job ahead of it
+        ahead = position + 1
+        rate_wait = queue.rate_delay(ahead)
+        free = queue.limit.concurrency - queue.in_flight
+        slot_wait = 0.0
+        if ahead > free and queue.mean_duration:
+            slot_wait = (ahead - free) * queue.mean_duration / queue.limit.concurrency
+        return max(rate_wait, slot_wait)
+
+    def _queue(self, model):
+        if model not in self._queues:
+            self._queues[model] = _ModelQueue(self.limits.get(model, self.default_limit), self.clock)
+        return self._queues[model]
+
+    async def _acquire(self, model, key):
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._cond:
+            self._queue(model).jobs.setdefault(key, collections.deque()).append(waiter)
+            self._dispatch()
+        try:
+            await waiter.future
+        except BaseException:
+            with self._cond:
+                if waiter.granted:
+                    # Granted while being cancelled: hand the slot on
+                    self._queues[model].in_flight -= 1
+                    self._dispatch()
+                else:
+                    waiters = self._queues[model].jobs.get(key)
+                    if waiters is not None and waiter in waiters:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del self._queues[model].jobs[key]
+            raise
+
+    def _release(self, model, duration):
+        with self._cond:
+            queue = self._queues[model]
+            queue.in_flight -= 1
+            queue.observe(duration)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant every slot that can be granted now. Must hold the lock."""
+        wake_at = None
+        for model, queue in self._queues.items():
+            while queue.jobs and queue.in_flight < queue.limit.concurrency:
+                delay = queue.rate_delay()
+                if delay > 0:
+                    wake_at = min(wake_at or float("inf"), self.clock() + delay)
+                    break
+                key, waiters = next(iter(queue.jobs.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.jobs.move_to_end(key)
+                else:
+                    del queue.jobs[key]
+                if waiter.future.cancelled():
+                    continue
+                if queue.bucket:
+                    queue.bucket.take()
+                queue.in_flight += 1
+                waiter.granted = True
+                self.granted[model] += 1
+                waiter.loop.call_soon_threadsafe(_grant, waiter.future)
+        if wake_at is not None:
+            self._wake_at(wake_at)
+
+    def _wake_at(self, when):
+        self._next_wake = when
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="comic-scheduler", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                timeout = self._next_wake - self.clock()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                self._next_wake = float("inf")
+                self._dispatch()
+                if self._next_wake == float("inf"):
+                    # Nothing is waiting on a token; the next request restarts the thread
+                    self._thread = None
+                    return
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the process-wide RequestScheduler configured from the environment.
+
+    Safe to call on every Streamlit rerun; the scheduler is created once.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler.from_env()
+        return _scheduler
@@ -0,0 +1,132 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.engine import ProgressCallback
+
+
+class _ProgressRelay(ProgressCallback):
+    """Queues a job's progress events for the thread that is waiting on the job."""
+
+    def __init__(self):
+        self.events = queue.SimpleQueue()
+
+    def start(self, num_pages):
+        self.events.put(("start", (num_pages,)))
+
+    def status(self, message, percent):
+        self.events.put(("status", (message, percent)))
+
+    def plot_ready(self, plot_text):
+        self.events.put(("plot_ready", (plot_text,)))
+
+    def page_ready(self, page_num, page_image):
+        self.events.put(("page_ready", (page_num, page_image)))
+
+    def retry(self, page_num, attempt, max_retries, error):
+        self.events.put(("retry", (page_num, attempt, max_retries, error)))
+
+    def error(self, message):
+        self.events.put(("error", (message,)))
+
+    def queued(self, status):
+        self.events.put(("queued", (status,)))
+
+
+class EngineWorker:
+    """
+    Runs comic jobs on one long-lived event loop in a background thread.
+
+    Every job of the process shares the worker's ComicEngine. The client (and
+    its pooled HTTP connections, which belong to the loop they were opened on),
+    the cache and the engine's semaphores are created once instead of per job.
+    The engine is built on the worker thread as soon as the worker starts, so
+    the slow google.genai import and client construction happen off the
+    caller's thread.
+
+    Callers block in `generate` / `resume` while the progress events of their
+    job are delivered to them on their own thread, as UI callbacks (Streamlit)
+    require.
+    """
+
+    def __init__(self, create_engine, heartbeat_interval=1.0):
+        """
+        :param create_engine: Callable returning the ComicEngine, called once on the worker thread
+        :param heartbeat_interval: Seconds between ProgressCallback.heartbeat calls on the caller's thread,
+                                   made whether or not progress events arrive in between
+        """
+        self.heartbeat_interval = heartbeat_interval
+        self._create_engine = create_engine
+        self._loop = asyncio.new_event_loop()
+        self._engine = Future()
+        self._thread = threading.Thread(target=self._run, name="comic-engine", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._engine.set_result(self._create_engine())
+        except BaseException as e:
+            self._engine.set_exception(e)
+            return
+        self._loop.run_forever()
+
+    @property
+    def engine(self):
+        """The ComicEngine, waiting for the worker to create it if needed."""
+        return self._engine.result()
+
+    @property
+    def ready(self):
+        """True once the engine exists (or failed to be created)."""
+        return self._engine.done()
+
+    def generate(self, *args, progress=None, **kwargs):
+        """Run `ComicEngine.generate(*args, **kwargs)` on the worker and return its ComicResult."""
+        return self._run_job(lambda engine, relay: engine.generate(*args, progress=relay, **kwargs), progress)
+
+    def resume(self, workspace, progress=None, **kwargs):
+        """Run `ComicEngine.resume(workspace, **kwargs)` on the worker and return its ComicResult."""
+        return self._run_job(lambda engine, relay: engine.resume(workspace, progress=relay, **kwargs), progress)
+
+    def _run_job(self, start, progress):
+        engine = self.engine
+        progress = progress or ProgressCallback()
+        relay = _ProgressRelay()
+
+        async def job():
+            try:
+                return await start(engine, relay)
+            finally:
+                relay.events.put(None)
+
+        future = asyncio.run_coroutine_threadsafe(job(), self._loop)
+        try:
+            # Heartbeats are timed independently of events, so a steady stream of
+            # events (e.g. queue updates while waiting for a slot) cannot starve them
+            next_heartbeat = time.monotonic() + self.heartbeat_interval
+            while True:
+                try:
+                    event = relay.events.get(timeout=max(0.0, next_heartbeat - time.monotonic()))
+                except queue.Empty:
+                    event = ()
+                if event is None:
+                    break
+                if event:
+                    name, args = event
+                    getattr(progress, name)(*args)
+                if time.monotonic() >= next_heartbeat:
+                    progress.heartbeat()
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+        except BaseException:
+            # The callback raised (e.g. the Streamlit session went away): cancel the job
+            future.cancel()
+            raise
+        return future.result()
+
+    def close(self):
+        """Stop the event loop. Jobs still running are abandoned."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# File that marks a directory as a run workspace; written by JobCheckpoint when a run starts.
+# The janitor only removes directories that contain it.
+RUN_MARKER = "job.json"
+
+
+class RunWorkspace:
+    """
+    Isolated output directory for a single comic generation run.
+
+    Every run gets its own directory under `root`, so concurrent sessions never
+    read or overwrite each other's page files.
+    """
+
+    def __init__(self, root, run_id=None):
+        """
+        :param root: Directory that holds all run workspaces
+        :param run_id: Identifier of the run; a unique one is generated if omitted
+        """
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.directory = os.path.join(root, self.run_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, filename):
+        """Return the path of `filename` inside this workspace."""
+        return os.path.join(self.directory, filename)
+
+
+def _last_modified(directory):
+    """Most recent modification time of a run directory or any file in it."""
+    latest = os.stat(directory).st_mtime
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                latest = max(latest, entry.stat().st_mtime)
+            except FileNotFoundError:
+                continue
+    return latest
+
+
+def _disk_usage(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+class WorkspaceJanitor(threading.Thread):
+    """
+    Background thread that deletes old run workspaces.
+
+    Runs idle for longer than `max_age` seconds are removed, then the least
+    recently used runs are removed until the total size fits in `max_bytes`.
+    Only directories holding a RUN_MARKER count as runs, so other directories
+    under `root` (e.g. the batch CLI's `<job file>/` directories, whose runs
+    are one level down) are left alone.
+    """
+
+    def __init__(self, root, max_age=24 * 3600, max_bytes=2 * 1024**3, interval=300):
+        """
+        :param root: Directory that holds all run workspaces
+        :param max_age: Seconds since last modification after which a run is deleted
+        :param max_bytes: Total disk budget for all runs, in bytes
+        :param interval: Seconds between sweeps
+        """
+        super().__init__(name="workspace-janitor", daemon=True)
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def sweep(self):
+        """Run one eviction pass. Returns the list of removed run ids."""
+        if not os.path.isdir(self.root):
+            return []
+
+        now = time.time()
+        runs = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_dir() and os.path.isfile(os.path.join(entry.path, RUN_MARKER)):
+                    try:
+                        runs.append((_last_modified(entry.path), _disk_usage(entry.path), entry))
+                    except FileNotFoundError:
+                        continue
+
+        removed = []
+        total = sum(size for _, size, _ in runs)
+        for modified, size, entry in sorted(runs, key=lambda run: run[0]):
+            if now - modified <= self.max_age and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total -= size
+            removed.append(entry.name)
+        return removed
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"An error occurred while cleaning up workspaces: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def start_janitor(root, **kwargs):
+    """
+    Start the process-wide janitor for `root` if it is not already running.
+
+    Safe to call on every Streamlit rerun; only the first call starts a thread.
+    """
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None or not _janitor.is_alive():
+            _janitor = WorkspaceJanitor(root, **kwargs)
+            _janitor.start()
+        return _janitor
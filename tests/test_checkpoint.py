@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from src.backend import FakeClient
+from src.checkpoint import JobCheckpoint
+from src.engine import IMAGE_MODEL, ComicEngine
+from src.workspace import RunWorkspace
+
+NUM_PAGES = 3
+
+
+class ScriptedClient(FakeClient):
+    """
+    FakeClient with an instant plot whose stream can break after page 2 is
+    published, and whose image calls can start failing after a number of pages.
+    """
+
+    def __init__(self, break_stream=False, images=None, image_latency=0):
+        super().__init__(plot_latency=0, image_latency=image_latency)
+        self.images = images
+        if break_stream:
+            self.aio.models.generate_content_stream = self._broken_stream
+
+    def _image(self, model, contents, config):
+        if self.images is not None:
+            if not self.images:
+                raise errors.ClientError(400, {"error": {"code": 400, "message": "Rejected (fake)."}})
+            self.images -= 1
+        return super()._image(model, contents, config)
+
+    async def _broken_stream(self, model, contents, config=None):
+        _, chunks = self._plot_chunks(model, contents)
+
+        async def stream():
+            text = ""
+            for chunk in chunks:
+                yield chunk
+                text += chunk.text
+                if "[Page 3]" in text:
+                    # Let pages 1 and 2 be drawn and checkpointed before the stream dies
+                    await asyncio.sleep(0.5)
+                    raise errors.ServerError(503, {"error": {"code": 503, "message": "Stream reset (fake)."}})
+
+        return stream()
+
+
+def run(client, workspace, resume=False):
+    engine = ComicEngine(client)
+    if resume:
+        return asyncio.run(engine.resume(workspace))
+    return asyncio.run(engine.generate(NUM_PAGES, "Space pirates", workspace=workspace))
+
+
+def saved_pages(workspace):
+    return {page_num: page.data for page_num, page in JobCheckpoint(workspace).load_pages().items()}
+
+
+def test_pages_of_an_abandoned_plot_are_not_resumed(tmp_path):
+    workspace = RunWorkspace(str(tmp_path), run_id="run")
+
+    # 1. The plot stream fails after pages 1 and 2 were generated from it
+    with pytest.raises(Exception, match="Plot stream failed"):
+        run(ScriptedClient(break_stream=True), workspace)
+    assert sorted(saved_pages(workspace)) == [1, 2]
+    assert JobCheckpoint(workspace).load_plot() is None
+
+    # 2. The same job streams a new plot, but fails after drawing page 1 (which
+    #    takes long enough for the whole plot to be streamed and saved first)
+    with pytest.raises(Exception, match="Rejected"):
+        run(ScriptedClient(images=1, image_latency=0.2), workspace)
+    assert JobCheckpoint(workspace).load_plot() is not None
+    assert sorted(saved_pages(workspace)) == [1]
+
+    # 3. Resuming keeps page 1 of the new plot and redraws pages 2 and 3
+    client = ScriptedClient()
+    result = run(client, workspace, resume=True)
+
+    assert len(result.pages) == NUM_PAGES
+    assert client.stats[f"{IMAGE_MODEL}.images"] == 2
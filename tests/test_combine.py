@@ -0,0 +1,45 @@
+import io
+
+import pytest
+from PIL import Image
+
+from src.combine import combine_images_vertical
+from src.image_buffer import ImageBuffer
+
+
+def png(img):
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode, color", [("RGB", (0, 0, 255)), ("L", 0), ("RGBA", (0, 0, 255, 128))])
+def test_narrower_pages_are_padded_with_white(mode, color):
+    wide = Image.new(mode, (100, 30), color)
+    narrow = Image.new(mode, (60, 30), color)
+    output = io.BytesIO()
+
+    combine_images_vertical([wide, narrow], output, band_height=7)
+
+    with Image.open(output) as combined:
+        assert combined.mode == mode
+        assert combined.size == (100, 60)
+        assert combined.getpixel((10, 45)) == color
+        assert combined.getpixel((80, 45)) == (255 if mode == "L" else (255,) * len(mode))
+
+
+def test_truncated_page_raises_and_removes_the_output(tmp_path):
+    page = png(Image.new("RGB", (64, 64), "red"))
+    output = tmp_path / "comic.png"
+
+    with pytest.raises(OSError):
+        combine_images_vertical([ImageBuffer(page), ImageBuffer(page[: len(page) // 2])], str(output))
+
+    assert not output.exists()
+
+
+def test_truncated_page_raises_with_a_file_object():
+    page = png(Image.new("RGB", (64, 64), "red"))
+
+    with pytest.raises(OSError):
+        combine_images_vertical([ImageBuffer(page), ImageBuffer(page[: len(page) // 2])], io.BytesIO())
@@ -0,0 +1,60 @@
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from src.image_buffer import ImageBuffer
+from src.postprocess import PagePostProcessor, PostProcessOptions
+
+
+def noisy_page(width, height, format="PNG"):
+    """A page of colour noise, which re-encodes poorly: processing it never shrinks it."""
+    rng = np.random.default_rng(width * height)
+    img = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    img.save(buffer, format, **({"quality": 60} if format == "JPEG" else {"compress_level": 9}))
+    return ImageBuffer(buffer.getvalue())
+
+
+def process(pages, **options):
+    async def run():
+        postprocessor = PagePostProcessor(PostProcessOptions(**options))
+        for page_num, page in enumerate(pages, start=1):
+            postprocessor.submit(page_num, page)
+        return await postprocessor.results()
+
+    return asyncio.run(run())
+
+
+def sizes(pages):
+    sizes = []
+    for page in pages:
+        with page.open() as img:
+            sizes.append(img.size)
+    return sizes
+
+
+def test_normalized_pages_keep_their_new_size_even_when_larger():
+    pages = [noisy_page(400, 500), noisy_page(300, 400, "JPEG")]
+
+    processed, reports = process(pages, trim=False, tone="color", quantize=False)
+
+    assert sizes(processed) == [(400, 500), (400, 533)]
+    assert [report.size for report in reports] == [(400, 500), (400, 533)]
+    assert processed[0] is pages[0]
+    assert processed[1].mime_type == "image/jpeg"
+
+
+def test_reencoding_alone_never_grows_a_page():
+    # A 1-bit page is as small as it gets; any palette stores it in more bits
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 2, (200, 200), dtype=np.uint8) * 255).convert("1").save(buffer, "PNG")
+    page = ImageBuffer(buffer.getvalue())
+
+    processed, reports = process([page], trim=False, normalize=False, tone="color", quantize=True)
+
+    assert processed == [page]
+    assert reports[0].mode is None
+    assert reports[0].saved_bytes == 0
@@ -0,0 +1,137 @@
+import re
+
+import pytest
+
+from src.prompt_splitter import PageStreamSplitter, PlotFormatError, check_page_order, split_pages
+
+PLOT = """Title: The Last Bell
+
+[Page 1]
+Panel 1: A classroom at dusk.
+Aiko: "We're late!"
+
+[Page 2]
+Panel 1: The hallway.
+Panel 2: Ren turns around.
+
+[Page 3]
+Panel 1: The rooftop.
+Ren: "You came."
+"""
+
+
+def stream(chunks):
+    """Feed `chunks` to a PageStreamSplitter; return its pages like split_pages does, and the splitter."""
+    splitter = PageStreamSplitter()
+    pages = []
+    for chunk in chunks:
+        pages += splitter.feed(chunk)
+    pages += splitter.close()
+    return {page.key: page.text for page in pages}, splitter
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(PLOT)])
+def test_chunked_stream_matches_split_pages(size):
+    pages, splitter = stream(chunked(PLOT, size))
+
+    assert pages == split_pages(PLOT)
+    assert list(pages) == ["page1", "page2", "page3"]
+    assert splitter.headings == [1, 2, 3]
+
+
+def test_heading_split_across_chunks():
+    head, tail = PLOT.split("[Page 2]\n")
+    chunks = [head + "[Pa", "ge 2]\n", tail]
+
+    pages, splitter = stream(chunks)
+
+    assert pages == split_pages(PLOT)
+    assert pages["page2"].startswith("[Page 2]\nPanel 1: The hallway.")
+    assert splitter.headings == [1, 2, 3]
+
+
+def test_heading_is_reported_before_its_page_ends():
+    splitter = PageStreamSplitter()
+
+    assert splitter.feed("[Page 1]\nPanel 1: A classroom.\n[Pa") == []
+    assert splitter.headings == [1]
+    finished = splitter.feed("ge 2]\nPanel 1")
+
+    assert [page.key for page in finished] == ["page1"]
+    assert splitter.headings == [1, 2]
+
+
+@pytest.mark.parametrize("size", [1, 5, len(PLOT)])
+def test_crlf_line_endings(size):
+    text = PLOT.replace("\n", "\r\n")
+
+    pages, _ = stream(chunked(text, size))
+
+    assert pages == split_pages(text)
+    assert pages == split_pages(PLOT)
+    assert not any("\r" in page for page in pages.values())
+
+
+def test_last_page_without_trailing_newline():
+    text = PLOT.rstrip("\n")
+
+    pages, _ = stream(chunked(text, 4))
+
+    assert pages == split_pages(text)
+    assert pages["page3"].endswith('Ren: "You came."')
+
+
+def test_last_heading_without_trailing_newline():
+    text = PLOT + "[Page 4]"
+
+    pages, splitter = stream(chunked(text, 3))
+
+    assert pages == split_pages(text)
+    assert pages["page4"] == "[Page 4]"
+    assert splitter.headings == [1, 2, 3, 4]
+
+
+def test_text_before_first_heading_is_ignored():
+    pages, _ = stream(["Here is your plot.\n\n", PLOT])
+
+    assert pages == split_pages(PLOT)
+    assert "Title" not in pages["page1"]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        (PLOT.replace("[Page 3]", "[Page 2]"), "duplicate page(s) 2"),
+        (PLOT.replace("[Page 2]", "[Page 1]"), "duplicate page(s) 1"),
+        (PLOT.replace("[Page 2]", "[Page 3]"), "missing page(s) 2"),
+        (PLOT.replace("[Page 2]", "[Page 4]"), "missing page(s) 2"),
+    ],
+    ids=["repeated", "repeated-first", "skipped", "skipped-beyond-comic"],
+)
+def test_duplicate_or_skipped_heading_is_rejected(text, message):
+    splitter = PageStreamSplitter()
+
+    with pytest.raises(PlotFormatError, match=re.escape(message)):
+        for chunk in chunked(text, 5):
+            splitter.feed(chunk)
+            check_page_order(splitter.headings, 3)
+
+
+def test_page_order_is_rejected_as_soon_as_the_heading_arrives():
+    splitter = PageStreamSplitter()
+    splitter.feed("[Page 1]\nPanel 1: A classroom.\n")
+    check_page_order(splitter.headings, 3)
+
+    splitter.feed("[Page 3]\n")
+
+    with pytest.raises(PlotFormatError, match="missing page"):
+        check_page_order(splitter.headings, 3)
+
+
+def test_page_order_ignores_pages_beyond_the_comic():
+    check_page_order([1, 2, 3, 4, 4], 3)
+    check_page_order([1, 2], 3)
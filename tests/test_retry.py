@@ -0,0 +1,204 @@
+import asyncio
+import types
+
+import pytest
+from google.genai import errors
+
+from src.retry import EmptyResponseError, RetryError, RetryPolicy, SafetyBlockedError, check_blocked
+
+MODEL = "image-model"
+
+
+class FakeClient:
+    """Answers each call with the next scripted outcome: an exception to raise or a response to return."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def generate_content(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def image_response():
+    return types.SimpleNamespace(parts=[types.SimpleNamespace(inline_data=b"png")], candidates=[])
+
+
+def empty_response():
+    return types.SimpleNamespace(parts=None, candidates=[])
+
+
+def blocked_response():
+    return types.SimpleNamespace(
+        parts=None,
+        prompt_feedback=types.SimpleNamespace(block_reason="SAFETY"),
+        candidates=[],
+    )
+
+
+def api_error(code, details=None, headers=None):
+    response = types.SimpleNamespace(headers=headers or {})
+    return errors.APIError(code, {"error": {"code": code, "message": "boom", **(details or {})}}, response)
+
+
+def request_for(client):
+    """An attempt as the engine makes it: unusable responses raise."""
+
+    async def request():
+        response = await client.generate_content()
+        check_blocked(response)
+        if not response.parts:
+            raise EmptyResponseError("Response has no parts")
+        return response
+
+    return request
+
+
+class Sleeps:
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+
+
+def make_policy(rng=lambda: 0.5, **kwargs):
+    sleep = Sleeps()
+    return RetryPolicy(sleep=sleep, rng=rng, **kwargs), sleep
+
+
+def test_retry_after_header_is_honoured():
+    policy, sleep = make_policy()
+    client = FakeClient(api_error(429, headers={"retry-after": "7"}), image_response())
+
+    result = asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert result.parts
+    assert sleep.delays == [7.0]
+
+
+def test_retry_info_delay_is_honoured_and_capped():
+    policy, sleep = make_policy(max_retry_after=20.0)
+    retry_info = {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12.5s"}]}
+    client = FakeClient(
+        api_error(429, details=retry_info),
+        api_error(429, details={"details": [{"retryDelay": "90s"}]}),
+        image_response(),
+    )
+
+    asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert sleep.delays == [12.5, 20.0]
+
+
+@pytest.mark.parametrize("jitter", [0.0, 0.999])
+def test_server_errors_are_retried_within_backoff_bounds(jitter):
+    policy, sleep = make_policy(rng=lambda: jitter, base_delay=2.0, max_delay=5.0, max_attempts=4)
+    client = FakeClient(api_error(503), api_error(503), api_error(503), image_response())
+
+    asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert client.calls == 4
+    # Equal jitter: half of the capped exponential delay plus up to the other half
+    for attempt, delay in enumerate(sleep.delays, start=1):
+        ceiling = min(5.0, 2.0 * 2 ** (attempt - 1))
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_retries_stop_after_max_attempts():
+    policy, sleep = make_policy(max_attempts=3)
+    client = FakeClient(api_error(503), api_error(503), api_error(503), image_response())
+
+    with pytest.raises(RetryError) as excinfo:
+        asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert excinfo.value.attempts == 3
+    assert excinfo.value.cause.code == 503
+    assert len(sleep.delays) == 2
+
+
+@pytest.mark.parametrize(
+    "outcome, cause",
+    [
+        (blocked_response(), SafetyBlockedError),
+        (api_error(401), errors.APIError),
+        (api_error(403), errors.APIError),
+        (api_error(400), errors.APIError),
+    ],
+)
+def test_fatal_errors_are_not_retried(outcome, cause):
+    policy, sleep = make_policy()
+    client = FakeClient(outcome, image_response())
+
+    with pytest.raises(RetryError) as excinfo:
+        asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert isinstance(excinfo.value.cause, cause)
+    assert excinfo.value.attempts == 1
+    assert client.calls == 1
+    assert sleep.delays == []
+
+
+def test_empty_parts_are_retried():
+    policy, sleep = make_policy()
+    client = FakeClient(empty_response(), empty_response(), image_response())
+
+    result = asyncio.run(policy.run(MODEL, request_for(client)))
+
+    assert result.parts
+    assert client.calls == 3
+    assert len(sleep.delays) == 2
+
+
+def test_model_attempts_override_the_default():
+    policy, _ = make_policy(max_attempts=4, model_attempts={"plot-model": 2})
+
+    plot_client = FakeClient(*[api_error(503)] * 4)
+    with pytest.raises(RetryError) as excinfo:
+        asyncio.run(policy.run("plot-model", request_for(plot_client)))
+    assert excinfo.value.attempts == 2
+
+    image_client = FakeClient(*[api_error(503)] * 4)
+    with pytest.raises(RetryError) as excinfo:
+        asyncio.run(policy.run(MODEL, request_for(image_client)))
+    assert excinfo.value.attempts == 4
+
+
+def test_on_retry_reports_each_retry():
+    policy, sleep = make_policy()
+    client = FakeClient(api_error(429, headers={"retry-after": "3"}), empty_response(), image_response())
+    retries = []
+
+    asyncio.run(policy.run(MODEL, request_for(client), lambda *args: retries.append(args)))
+
+    assert [(attempt, max_attempts, delay) for attempt, max_attempts, _, delay in retries] == [
+        (1, 4, 3.0),
+        (2, 4, sleep.delays[1]),
+    ]
+
+
+def test_stats_count_attempts_errors_and_outcomes():
+    policy, _ = make_policy(max_attempts=3, model_attempts={"plot-model": 2})
+    asyncio.run(policy.run(MODEL, request_for(FakeClient(api_error(429), empty_response(), image_response()))))
+    asyncio.run(policy.run(MODEL, request_for(FakeClient(image_response()))))
+    with pytest.raises(RetryError):
+        asyncio.run(policy.run(MODEL, request_for(FakeClient(blocked_response()))))
+    with pytest.raises(RetryError):
+        asyncio.run(policy.run("plot-model", request_for(FakeClient(api_error(503), api_error(503)))))
+
+    assert policy.stats() == {
+        MODEL: {
+            "attempts": 5,
+            "retries": 2,
+            "successes": 2,
+            "error:429": 1,
+            "error:empty": 1,
+            "error:safety": 1,
+            "fatal": 1,
+        },
+        "plot-model": {"attempts": 2, "retries": 1, "error:503": 2, "exhausted": 1},
+    }
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from src.engine import ProgressCallback
+from src.worker import EngineWorker
+
+
+class QueuedEngine:
+    """Stands in for ComicEngine: reports a queue update every 20 ms, as a job waiting for a slot does."""
+
+    async def generate(self, updates, progress=None):
+        for position in range(updates):
+            progress.queued(position)
+            await asyncio.sleep(0.02)
+        return "comic"
+
+
+class RecordingProgress(ProgressCallback):
+    def __init__(self):
+        self.queued_events = []
+        self.heartbeats = []
+
+    def queued(self, status):
+        self.queued_events.append(status)
+
+    def heartbeat(self):
+        self.heartbeats.append(time.monotonic())
+
+
+@pytest.fixture
+def worker():
+    worker = EngineWorker(QueuedEngine, heartbeat_interval=0.1)
+    yield worker
+    worker.close()
+
+
+def test_heartbeat_is_not_starved_by_events(worker):
+    progress = RecordingProgress()
+    started = time.monotonic()
+
+    assert worker.generate(50, progress=progress) == "comic"
+
+    elapsed = time.monotonic() - started
+    assert len(progress.queued_events) == 50
+    # One heartbeat per interval, although an event arrives more often than that
+    assert len(progress.heartbeats) >= int(elapsed / 0.1) - 1
+    gaps = [b - a for a, b in zip(progress.heartbeats, progress.heartbeats[1:])]
+    assert all(gap >= 0.09 for gap in gaps)
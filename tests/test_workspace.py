@@ -0,0 +1,51 @@
+import os
+import time
+
+from src.workspace import RUN_MARKER, RunWorkspace, WorkspaceJanitor
+
+
+def make_run(root, run_id, size=10, age=0):
+    """A run workspace with a marker and one page of `size` bytes, last modified `age` seconds ago."""
+    workspace = RunWorkspace(root, run_id=run_id)
+    for filename, data in ((RUN_MARKER, b"{}"), ("page1_image.png", b"x" * size)):
+        with open(workspace.path(filename), "wb") as f:
+            f.write(data)
+    modified = time.time() - age
+    for path in (workspace.path(RUN_MARKER), workspace.path("page1_image.png"), workspace.directory):
+        os.utime(path, (modified, modified))
+    return workspace
+
+
+def test_old_runs_are_removed(tmp_path):
+    make_run(tmp_path, "old", age=7200)
+    make_run(tmp_path, "new")
+
+    removed = WorkspaceJanitor(str(tmp_path), max_age=3600).sweep()
+
+    assert removed == ["old"]
+    assert sorted(os.listdir(tmp_path)) == ["new"]
+
+
+def test_least_recently_used_runs_are_removed_to_fit_the_budget(tmp_path):
+    make_run(tmp_path, "a", size=100, age=30)
+    make_run(tmp_path, "b", size=100, age=20)
+    make_run(tmp_path, "c", size=100, age=10)
+
+    removed = WorkspaceJanitor(str(tmp_path), max_bytes=250).sweep()
+
+    assert removed == ["a"]
+
+
+def test_batch_directories_are_not_runs(tmp_path):
+    # The batch CLI writes output/<job file>/<job id>/; only the job directories carry a marker
+    batch = tmp_path / "jobs"
+    make_run(batch, "romcom-1", age=7200)
+    (tmp_path / "notes").mkdir()
+    old = time.time() - 7200
+    for path in (batch, tmp_path / "notes"):
+        os.utime(path, (old, old))
+
+    removed = WorkspaceJanitor(str(tmp_path), max_age=3600, max_bytes=0).sweep()
+
+    assert removed == []
+    assert os.path.isdir(batch / "romcom-1")